@@ -1,10 +1,19 @@
-from flask import Flask, render_template, jsonify
-import pandas as pd
-import sqlite3
+from flask import Flask, render_template, jsonify, g, request
 import json
+import os
+import sqlite3
+import threading
+import hashlib
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
 import openai
 from pdfminer.high_level import extract_text
 from flask_cors import CORS
+from db import ConnectionPool, create_schema, create_llm_cache, create_search_index, SEARCH_COLUMNS
+from blob_store import create_blob_tables, read_blobs, shared_store
 
 def load_config(file_name):
     # Load the config file
@@ -15,6 +24,19 @@ config = load_config('config.json')
 app = Flask(__name__)
 CORS(app)
 app.config['TEMPLATES_AUTO_RELOAD'] = True
+db_pool = ConnectionPool(config)
+
+def get_db():
+    # Borrow a database connection from the pool for the rest of the request, it is returned in close_db
+    if 'db' not in g:
+        g.db = db_pool.get()
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.put(conn)
 
 def read_pdf(file_path):
     try:
@@ -27,6 +49,19 @@ def read_pdf(file_path):
         print(f"An error occurred while reading the PDF: {e}")
         return None
 
+@lru_cache(maxsize=4)
+def _read_pdf_cached(file_path, mtime):
+    return read_pdf(file_path)
+
+def read_resume(file_path):
+    # The resume text is only extracted again when the PDF changes
+    try:
+        mtime = os.path.getmtime(file_path)
+    except OSError:
+        print(f"Error: The file '{file_path}' was not found.")
+        return None
+    return _read_pdf_cached(file_path, mtime)
+
 # db = load_config('config.json')['db_path']
 # try:
 #     api_key = load_config('config.json')['OpenAI_API_KEY']
@@ -40,120 +75,253 @@ def read_pdf(file_path):
 # except:
 #     print("No OpenAI Model found or it's incorrectly specified in the config. Please add one to config.json")
 
+# Columns needed to render the job list. Descriptions, resumes and cover letters are only loaded by the detail endpoints.
+SUMMARY_COLUMNS = ['id', 'title', 'company', 'location', 'date', 'applied', 'hidden', 'interview', 'rejected']
+STATUS_FILTERS = ['hidden', 'applied', 'interview', 'rejected']
+
 @app.route('/')
 def home():
-    jobs = read_jobs_from_db()
-    return render_template('jobs.html', jobs=jobs)
+    page_size = config.get('page_size', 100)
+    jobs = read_jobs_from_db({'hidden': 0}, limit=page_size)
+    next_before_id = jobs[-1]['id'] if len(jobs) > 0 and len(jobs) == page_size else None
+    return render_template('jobs.html', jobs=jobs, next_before_id=next_before_id)
+
+# Rendered job pages by job id, each stored with the last_modified of the row it was rendered from. Least recently used
+# pages are dropped once there are more than config['page_cache_size'] of them.
+page_cache = OrderedDict()
+page_cache_lock = threading.Lock()
 
 @app.route('/job/<int:job_id>')
 def job(job_id):
-    jobs = read_jobs_from_db()
-    return render_template('./templates/job_description.html', job=jobs[job_id])
+    row = get_db().execute("SELECT last_modified FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return "Job not found", 404
+    last_modified = row[0]
+    with page_cache_lock:
+        cached = page_cache.get(job_id)
+        if cached is not None and cached[0] == last_modified:
+            page_cache.move_to_end(job_id)
+            return cached[1]
+    page = render_template('job_description.html', job=read_job_from_db(job_id))
+    cache_size = config.get('page_cache_size', 256)
+    with page_cache_lock:
+        page_cache[job_id] = (last_modified, page)
+        page_cache.move_to_end(job_id)
+        while len(page_cache) > cache_size:
+            page_cache.popitem(last=False)
+    return page
+
+def int_arg(name, default, minimum, maximum=None):
+    # An integer query parameter, or default if it's not given. Raises ValueError if it isn't an integer within the bounds.
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if number < minimum or (maximum is not None and number > maximum):
+        bounds = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+        raise ValueError(f"{name} must be {bounds}")
+    return number
+
+def list_filters():
+    # The status and posting date filters of the job list from the query parameters. Raises ValueError for invalid values.
+    filters = {}
+    for column in STATUS_FILTERS:
+        value = int_arg(column, None, 0, 1)
+        if value is not None:
+            filters[column] = value
+    for key in ('date_from', 'date_to'):
+        value = request.args.get(key)
+        if value:
+            try:
+                valid = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d') == value
+            except ValueError:
+                valid = False
+            if not valid:
+                raise ValueError(f"{key} must be a date as YYYY-MM-DD")
+            filters[key] = value
+    return filters
 
 @app.route('/get_all_jobs')
 def get_all_jobs():
-    conn = sqlite3.connect(config["db_path"])
-    query = "SELECT * FROM jobs"
-    df = pd.read_sql_query(query, conn)
-    df = df.sort_values(by='id', ascending=False)
-    df.reset_index(drop=True, inplace=True)
-    jobs = df.to_dict('records')
-    return jsonify(jobs)
+    # One page of job summaries, newest first. Query parameters: limit (1 to 1000), before_id (the next_before_id of the
+    # previous page), hidden / applied / interview / rejected (0 or 1) and date_from / date_to (YYYY-MM-DD, on the posting date).
+    try:
+        limit = int_arg('limit', config.get('page_size', 100), 1, 1000)
+        before_id = int_arg('before_id', None, 1)
+        filters = list_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    jobs = read_jobs_from_db(filters, before_id, limit)
+    next_before_id = jobs[-1]['id'] if len(jobs) > 0 and len(jobs) == limit else None
+    return jsonify({"jobs": jobs, "next_before_id": next_before_id})
+
+@app.route('/search')
+def search():
+    # Full-text search over the title, company, location and description of the jobs, best matches first. Query parameters:
+    # q (FTS5 query syntax, e.g. python AND (django OR flask), or just words), limit (1 to 1000), offset and the filters of
+    # /get_all_jobs.
+    # Every job comes with a snippet of its description with the matching words marked by **.
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = int_arg('limit', config.get('page_size', 100), 1, 1000)
+        offset = int_arg('offset', 0, 0)
+        filters = list_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        jobs = search_jobs_in_db(query, filters, limit, offset)
+    except sqlite3.OperationalError:
+        # Not a valid FTS5 query (e.g. an unbalanced quote), search for the words as typed instead
+        words = ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+        try:
+            jobs = search_jobs_in_db(words, filters, limit, offset)
+        except sqlite3.OperationalError as e:
+            return jsonify({"error": f"Search failed: {e}"}), 400
+    next_offset = offset + limit if len(jobs) == limit else None
+    return jsonify({"jobs": jobs, "next_offset": next_offset})
 
 @app.route('/job_details/<int:job_id>')
 def job_details(job_id):
-    conn = sqlite3.connect(config["db_path"])
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
-    job_tuple = cursor.fetchone()
-    conn.close()
-    if job_tuple is not None:
-        # Get the column names from the cursor description
-        column_names = [column[0] for column in cursor.description]
-        # Create a dictionary mapping column names to row values
-        job = dict(zip(column_names, job_tuple))
+    job = read_job_from_db(job_id)
+    if job is not None:
         return jsonify(job)
     else:
         return jsonify({"error": "Job not found"}), 404
 
 @app.route('/hide_job/<int:job_id>', methods=['POST'])
 def hide_job(job_id):
-    conn = sqlite3.connect(config["db_path"])
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("UPDATE jobs SET hidden = 1 WHERE id = ?", (job_id,))
     conn.commit()
-    conn.close()
     return jsonify({"success": "Job marked as hidden"}), 200
 
 
 @app.route('/mark_applied/<int:job_id>', methods=['POST'])
 def mark_applied(job_id):
     print("Applied clicked!")
-    conn = sqlite3.connect(config["db_path"])
+    conn = get_db()
     cursor = conn.cursor()
     query = "UPDATE jobs SET applied = 1 WHERE id = ?"
     print(f'Executing query: {query} with job_id: {job_id}')  # Log the query
     cursor.execute(query, (job_id,))
     conn.commit()
-    conn.close()
     return jsonify({"success": "Job marked as applied"}), 200
 
 @app.route('/mark_interview/<int:job_id>', methods=['POST'])
 def mark_interview(job_id):
     print("Interview clicked!")
-    conn = sqlite3.connect(config["db_path"])
+    conn = get_db()
     cursor = conn.cursor()
     query = "UPDATE jobs SET interview = 1 WHERE id = ?"
     print(f'Executing query: {query} with job_id: {job_id}')
     cursor.execute(query, (job_id,))
     conn.commit()
-    conn.close()
     return jsonify({"success": "Job marked as interview"}), 200
 
 @app.route('/mark_rejected/<int:job_id>', methods=['POST'])
 def mark_rejected(job_id):
     print("Rejected clicked!")
-    conn = sqlite3.connect(config["db_path"])
+    conn = get_db()
     cursor = conn.cursor()
     query = "UPDATE jobs SET rejected = 1 WHERE id = ?"
     print(f'Executing query: {query} with job_id: {job_id}')
     cursor.execute(query, (job_id,))
     conn.commit()
-    conn.close()
     return jsonify({"success": "Job marked as rejected"}), 200
 
 @app.route('/get_cover_letter/<int:job_id>')
 def get_cover_letter(job_id):
-    conn = sqlite3.connect(config["db_path"])
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT cover_letter FROM jobs WHERE id = ?", (job_id,))
+    cursor.execute("SELECT id, cover_letter FROM jobs WHERE id = ?", (job_id,))
     cover_letter = cursor.fetchone()
-    conn.close()
     if cover_letter is not None:
-        return jsonify({"cover_letter": cover_letter[0]})
+        return jsonify({"cover_letter": read_blobs(conn, "jobs", dict(zip(['id', 'cover_letter'], cover_letter)))['cover_letter']})
     else:
         return jsonify({"error": "Cover letter not found"}), 404
 
-@app.route('/get_resume/<int:job_id>', methods=['POST'])
-def get_resume(job_id):
-    print("Resume clicked!")
-    conn = sqlite3.connect(config["db_path"])
-    cursor = conn.cursor()
-    cursor.execute("SELECT job_description, title, company FROM jobs WHERE id = ?", (job_id,))
-    job_tuple = cursor.fetchone()
-    if job_tuple is not None:
-        # Get the column names from the cursor description
-        column_names = [column[0] for column in cursor.description]
-        # Create a dictionary mapping column names to row values
-        job = dict(zip(column_names, job_tuple))
-    resume = read_pdf(config["resume_path"])
+class GenerationError(Exception):
+    # A resume or cover letter couldn't be generated. status is the HTTP status the endpoints answer with.
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+def chat_completion(prompt, model):
+    # Ask the model, or return its earlier answer to the same prompt from the llm_cache table. Works with both the pre-1.0
+    # and the current openai package. OpenAI_API_Base points the requests to another OpenAI compatible server.
+    key = hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest()
+    conn = db_pool.get()
+    try:
+        row = conn.execute("SELECT response FROM llm_cache WHERE prompt_hash = ?", (key,)).fetchone()
+    finally:
+        db_pool.put(conn)
+    if row is not None:
+        return row[0]
+    messages = [{"role": "user", "content": prompt}]
+    try:
+        if hasattr(openai, 'OpenAI'):
+            client = openai.OpenAI(api_key=config["OpenAI_API_KEY"], base_url=config.get("OpenAI_API_Base") or None)
+            completion = client.chat.completions.create(model=model, messages=messages)
+        else:
+            openai.api_key = config["OpenAI_API_KEY"]
+            if config.get("OpenAI_API_Base"):
+                openai.api_base = config["OpenAI_API_Base"]
+            completion = openai.ChatCompletion.create(model=model, messages=messages)
+        response = completion.choices[0].message.content
+    except Exception as e:
+        print(f"Error connecting to OpenAI: {e}")
+        raise GenerationError(f"Error connecting to OpenAI: {e}", 500)
+    conn = db_pool.get()
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO llm_cache (prompt_hash, model, response, created) VALUES (?, ?, ?, ?)",
+                         (key, model, response, str(datetime.now())))
+    finally:
+        db_pool.put(conn)
+    return response
+
+def load_generation_inputs(job_id):
+    # The job and the resume text a resume or cover letter is generated from
+    conn = db_pool.get()
+    try:
+        row = conn.execute("SELECT id, job_description, title, company FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        job = read_blobs(conn, "jobs", dict(zip(['id', 'job_description', 'title', 'company'], row))) if row is not None else None
+    finally:
+        db_pool.put(conn)
+    if job is None:
+        raise GenerationError("Job not found", 404)
+    resume = read_resume(config["resume_path"])
+
+    # Check if resume is None
+    if resume is None:
+        print("Error: Resume not found or couldn't be read.")
+        raise GenerationError("Resume not found or couldn't be read.", 400)
 
     # Check if OpenAI API key is empty
     if not config["OpenAI_API_KEY"]:
         print("Error: OpenAI API key is empty.")
-        return jsonify({"error": "OpenAI API key is empty."}), 400
+        raise GenerationError("OpenAI API key is empty.", 400)
+    return job, resume
 
-    openai.api_key = config["OpenAI_API_KEY"]
+def save_generated(job_id, column, text):
+    conn = db_pool.get()
+    try:
+        with conn:
+            conn.execute(f"UPDATE jobs SET {column} = ? WHERE id = ?", (text, job_id))
+        if config.get('compressed_storage'):
+            shared_store(conn, config['compressed_storage'], ["jobs"]).compress_rows("jobs", "id = ?", (job_id,))
+    finally:
+        db_pool.put(conn)
+
+def generate_resume(job_id):
+    # Tailor the resume to the job and save it in the resume column
+    job, resume = load_generation_inputs(job_id)
     consideration = ""
     user_prompt = ("You are a career coach with a client that is applying for a job as a " 
                    + job['title'] + " at " + job['company'] 
@@ -165,114 +333,170 @@ def get_resume(job_id):
     if consideration:
         user_prompt += "\nConsider incorporating that " + consideration
 
-    try:
-        completion = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "user", "content": user_prompt},
-            ],
-        )
-        response = completion.choices[0].message.content
-    except Exception as e:
-        print(f"Error connecting to OpenAI: {e}")
-        return jsonify({"error": f"Error connecting to OpenAI: {e}"}), 500
-
-    query = "UPDATE jobs SET resume = ? WHERE id = ?"
-    print(f'Executing query: {query} with job_id: {job_id} and resume: {response}')
-    cursor.execute(query, (response, job_id))
-    conn.commit()
-    conn.close()
-    return jsonify({"resume": response}), 200
-
-@app.route('/get_CoverLetter/<int:job_id>', methods=['POST'])
-def get_CoverLetter(job_id):
-    print("CoverLetter clicked!")
-    conn = sqlite3.connect(config["db_path"])
-    cursor = conn.cursor()
-
-    def get_chat_gpt(prompt):
-        try:
-            completion = openai.ChatCompletion.create(
-                model=config["OpenAI_Model"],
-                messages=[
-                    {"role": "user", "content": prompt},
-                ],
-            )
-            return completion.choices[0].message.content
-        except Exception as e:
-            print(f"Error connecting to OpenAI: {e}")
-            return None
-
-    cursor.execute("SELECT job_description, title, company FROM jobs WHERE id = ?", (job_id,))
-    job_tuple = cursor.fetchone()
-    if job_tuple is not None:
-        column_names = [column[0] for column in cursor.description]
-        job = dict(zip(column_names, job_tuple))
-    
-    resume = read_pdf(config["resume_path"])
-
-    # Check if resume is None
-    if resume is None:
-        print("Error: Resume not found or couldn't be read.")
-        return jsonify({"error": "Resume not found or couldn't be read."}), 400
+    response = chat_completion(user_prompt, "gpt-3.5-turbo")
+    print(f'Saving resume for job_id: {job_id}')
+    save_generated(job_id, 'resume', response)
+    return response
 
-    # Check if OpenAI API key is empty
-    if not config["OpenAI_API_KEY"]:
-        print("Error: OpenAI API key is empty.")
-        return jsonify({"error": "OpenAI API key is empty."}), 400
-
-    openai.api_key = config["OpenAI_API_KEY"]
+def generate_cover_letter(job_id):
+    # Write a cover letter for the job, then have it improved in a second pass, and save it in the cover_letter column
+    job, resume = load_generation_inputs(job_id)
     consideration = ""
     user_prompt = ("You are a career coach with over 15 years of experience helping job seekers land their dream jobs in tech. You are helping a candidate to write a cover letter for the below role. Approach this task in three steps. Step 1. Identify main challenges someone in this position would face day to day. Step 2. Write an attention grabbing hook for your cover letter that highlights your experience and qualifications in a way that shows you empathize and can successfully take on challenges of the role. Consider incorporating specific examples of how you tackled these challenges in your past work, and explore creative ways to express your enthusiasm for the opportunity. Put emphasis on how the candidate can contribute to company as opposed to just listing accomplishments. Keep your hook within 100 words or less. Step 3. Finish writing the cover letter based on the resume and keep it within 250 words. Respond with final cover letter only. \n job description: " + job['job_description'] + "\n company: " + job['company'] + "\n title: " + job['title'] + "\n resume: " + resume)
     if consideration:
         user_prompt += "\nConsider incorporating that " + consideration
 
-    response = get_chat_gpt(user_prompt)
-    if response is None:
-        return jsonify({"error": "Failed to get a response from OpenAI."}), 500
+    response = chat_completion(user_prompt, config["OpenAI_Model"])
 
     user_prompt2 = ("You are young but experienced career coach helping job seekers land their dream jobs in tech. I need your help crafting a cover letter. Here is a job description: " + job['job_description'] + "\nhere is my resume: " + resume + "\nHere's the cover letter I got so far: " + response + "\nI need you to help me improve it. Let's approach this in following steps. \nStep 1. Please set the formality scale as follows: 1 is conversational English, my initial Cover letter draft is 10. Step 2. Identify three to five ways this cover letter can be improved, and elaborate on each way with at least one thoughtful sentence. Step 4. Suggest an improved cover letter based on these suggestions with the Formality Score set to 7. Avoid subjective qualifiers such as drastic, transformational, etc. Keep the final cover letter within 250 words. Please respond with the final cover letter only.")
     if user_prompt2:
-        response = get_chat_gpt(user_prompt2)
-        if response is None:
-            return jsonify({"error": "Failed to get a response from OpenAI."}), 500
+        response = chat_completion(user_prompt2, config["OpenAI_Model"])
 
-    query = "UPDATE jobs SET cover_letter = ? WHERE id = ?"
-    print(f'Executing query: {query} with job_id: {job_id} and cover letter: {response}')
-    cursor.execute(query, (response, job_id))
-    conn.commit()
-    conn.close()
-    return jsonify({"cover_letter": response}), 200
+    print(f'Saving cover letter for job_id: {job_id}')
+    save_generated(job_id, 'cover_letter', response)
+    return response
 
-def read_jobs_from_db():
-    conn = sqlite3.connect(config["db_path"])
-    query = "SELECT * FROM jobs WHERE hidden = 0"
-    df = pd.read_sql_query(query, conn)
-    df = df.sort_values(by='id', ascending=False)
-    # df.reset_index(drop=True, inplace=True)
-    return df.to_dict('records')
+GENERATORS = {'resume': generate_resume, 'cover_letter': generate_cover_letter}
 
-def verify_db_schema():
-    conn = sqlite3.connect(config["db_path"])
-    cursor = conn.cursor()
+# Background generation: tasks run in a thread pool of config['llm_concurrency'] threads, so a request never waits for the
+# model. Tasks by id, the same job and kind isn't queued twice while it is still running.
+generation_pool = ThreadPoolExecutor(max_workers=config.get('llm_concurrency', 4))
+generation_tasks = OrderedDict()
+generation_tasks_lock = threading.Lock()
+MAX_FINISHED_TASKS = 1000
 
-    # Get the table information
-    cursor.execute("PRAGMA table_info(jobs)")
-    table_info = cursor.fetchall()
+def run_generation_task(task_id):
+    with generation_tasks_lock:
+        task = generation_tasks[task_id]
+        task['status'] = 'running'
+    try:
+        GENERATORS[task['kind']](task['job_id'])
+    except GenerationError as e:
+        status, error = 'error', str(e)
+    except Exception as e:
+        print(f"Generating the {task['kind']} of job {task['job_id']} failed: {e}")
+        status, error = 'error', str(e)
+    else:
+        status, error = 'done', None
+    with generation_tasks_lock:
+        task['status'] = status
+        task['error'] = error
+
+def submit_generation(kind, job_id):
+    # Queue the generation and return its task id
+    with generation_tasks_lock:
+        for task_id, task in generation_tasks.items():
+            if task['kind'] == kind and task['job_id'] == job_id and task['status'] in ('queued', 'running'):
+                return task_id
+        task_id = uuid.uuid4().hex
+        generation_tasks[task_id] = {'id': task_id, 'kind': kind, 'job_id': job_id, 'status': 'queued', 'error': None}
+        # Forget the oldest finished tasks
+        finished = [key for key, task in generation_tasks.items() if task['status'] in ('done', 'error')]
+        for key in finished[:max(0, len(finished) - MAX_FINISHED_TASKS)]:
+            del generation_tasks[key]
+    generation_pool.submit(run_generation_task, task_id)
+    return task_id
+
+@app.route('/generate/<kind>/<int:job_id>', methods=['POST'])
+def generate(kind, job_id):
+    # Start generating the resume or cover_letter of a job in the background, poll /generation_status for the result
+    if kind not in GENERATORS:
+        return jsonify({"error": "kind must be resume or cover_letter"}), 400
+    return jsonify({"task_id": submit_generation(kind, job_id)}), 202
+
+@app.route('/generate_batch', methods=['POST'])
+def generate_batch():
+    # Start generating for many jobs at once. Body: {"kind": "cover_letter", "job_ids": [1, 2, 3]}
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    job_ids = data.get('job_ids')
+    if kind not in GENERATORS or not isinstance(job_ids, list) or not all(isinstance(job_id, int) for job_id in job_ids):
+        return jsonify({"error": "kind must be resume or cover_letter and job_ids a list of job ids"}), 400
+    return jsonify({"task_ids": {job_id: submit_generation(kind, job_id) for job_id in job_ids}}), 202
+
+@app.route('/generation_status')
+def generation_status():
+    # Status of the tasks in the comma separated ids parameter: queued, running, done or error (with the error message)
+    ids = [task_id for task_id in request.args.get('ids', '').split(',') if task_id]
+    with generation_tasks_lock:
+        tasks = {task_id: dict(generation_tasks[task_id]) for task_id in ids if task_id in generation_tasks}
+    return jsonify({"tasks": tasks})
+
+# Deprecated: the endpoints of the first versions, which answered once the model was done. They are queued like
+# /generate now and answer with the task id to poll /generation_status with.
+@app.route('/get_resume/<int:job_id>', methods=['POST'])
+def get_resume(job_id):
+    return generate('resume', job_id)
 
-    # Check if the "cover_letter" column exists
-    if "cover_letter" not in [column[1] for column in table_info]:
-        # If it doesn't exist, add it
-        cursor.execute("ALTER TABLE jobs ADD COLUMN cover_letter TEXT")
-        print("Added cover_letter column to jobs table")
+@app.route('/get_CoverLetter/<int:job_id>', methods=['POST'])
+def get_CoverLetter(job_id):
+    return generate('cover_letter', job_id)
+
+def filter_conditions(filters, table=''):
+    # SQL conditions and their parameters for the status and date filters of the job list
+    prefix = f"{table}." if table else ""
+    conditions = []
+    params = []
+    for column in STATUS_FILTERS:
+        if column in filters:
+            conditions.append(f"{prefix}{column} = ?")
+            params.append(filters[column])
+    if 'date_from' in filters:
+        conditions.append(f"{prefix}date >= ?")
+        params.append(filters['date_from'])
+    if 'date_to' in filters:
+        conditions.append(f"{prefix}date <= ?")
+        params.append(filters['date_to'])
+    return conditions, params
+
+def read_jobs_from_db(filters, before_id=None, limit=100):
+    # Read a page of job summaries, newest first. Pagination is keyset based: before_id is the id of the last job of the
+    # previous page. The filters are pushed down into the indexed query.
+    conditions, params = filter_conditions(filters)
+    if before_id is not None:
+        conditions.append("id < ?")
+        params.append(before_id)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    query = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM jobs {where} ORDER BY id DESC LIMIT ?"
+    cursor = get_db().execute(query, params + [limit])
+    return [dict(zip(SUMMARY_COLUMNS, row)) for row in cursor.fetchall()]
+
+def search_jobs_in_db(query, filters, limit=100, offset=0):
+    # One page of the jobs matching the FTS5 query, ranked by bm25 with the SEARCH_COLUMNS weights
+    conditions, params = filter_conditions(filters, 'jobs')
+    columns = ', '.join(f"jobs.{column}" for column in SUMMARY_COLUMNS)
+    weights = ', '.join(str(weight) for weight in SEARCH_COLUMNS.values())
+    description_column = list(SEARCH_COLUMNS).index('job_description')
+    sql = f'''
+        SELECT {columns}, snippet(jobs_fts, {description_column}, '**', '**', '...', 16)
+        FROM jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid
+        WHERE {' AND '.join(['jobs_fts MATCH ?'] + conditions)}
+        ORDER BY bm25(jobs_fts, {weights}) LIMIT ? OFFSET ?
+    '''
+    cursor = get_db().execute(sql, [query] + params + [limit, offset])
+    return [dict(zip(SUMMARY_COLUMNS + ['snippet'], row)) for row in cursor.fetchall()]
+
+def read_job_from_db(job_id):
+    # Fetch a single job by its primary key, or None if there is no such job
+    cursor = get_db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    job_tuple = cursor.fetchone()
+    if job_tuple is None:
+        return None
+    # Get the column names from the cursor description
+    column_names = [column[0] for column in cursor.description]
+    # Create a dictionary mapping column names to row values, with the texts kept in compressed storage filled in
+    return read_blobs(get_db(), "jobs", dict(zip(column_names, job_tuple)))
 
-    if "resume" not in [column[1] for column in table_info]:
-        # If it doesn't exist, add it
-        cursor.execute("ALTER TABLE jobs ADD COLUMN resume TEXT")
-        print("Added resume column to jobs table")
+def verify_db_schema():
+    # Add the columns and indexes missing from databases created by older versions
+    create_schema(get_db(), "jobs")
+    if config.get('compressed_storage'):
+        create_blob_tables(get_db(), ["jobs"])
+    create_search_index(get_db(), "jobs")
+    create_llm_cache(get_db())
 
-    conn.close()
 
 if __name__ == "__main__":
-    verify_db_schema()  # Verify the DB schema before running the app
+    with app.app_context():
+        verify_db_schema()  # Verify the DB schema before running the app
     app.run(debug=True, port=5001)
@@ -0,0 +1,254 @@
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time as tm
+import tracemalloc
+from urllib.parse import urlparse, parse_qs
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main
+from db import create_schema, create_search_index, insert_jobs
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+DEFAULT_SIZES = [1000, 100000]
+WORDS = ['python', 'developer', 'engineer', 'backend', 'data', 'platform', 'senior', 'cloud', 'api', 'team', 'remote',
+         'django', 'flask', 'postgres', 'kafka', 'farm', 'frontend', 'game', 'design', 'product', 'customer', 'growth']
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def search_page(start):
+    # The recorded search page with job ids shifted by the page offset, so every page has different jobs
+    content = read_fixture('search_page.html').decode('utf-8')
+    content = re.sub(r'jobPosting:(\d+)', lambda m: f"jobPosting:{int(m.group(1)) + start * 1000}", content)
+    return content.encode('utf-8')
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    # Serves the recorded fixtures in place of LinkedIn
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if 'seeMoreJobPostings' in url.path:
+            start = int(parse_qs(url.query).get('start', ['0'])[0])
+            body = search_page(start)
+        else:
+            body = read_fixture('job_page.html')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+
+
+def bench_config(db_path, base_url=''):
+    with open(os.path.join(ROOT, 'config_example.json')) as f:
+        config = json.load(f)
+    config.update({
+        'db_path': db_path,
+        'base_url': base_url,
+        'languages': [],
+        'pages_to_scrape': 4,
+        'concurrency': 4,
+        'request_delay': 0,
+        'rate_limit': 10000,
+    })
+    config.pop('cache_dir', None)
+    return config
+
+
+def synthetic_job(i, rng):
+    return {
+        'title': ' '.join(rng.choices(WORDS, k=3)).title(),
+        'company': f"Company {i % 5000}",
+        'location': 'Los Angeles, CA',
+        'date': f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'job_url': f"https://www.linkedin.com/jobs/view/{i}/",
+        'job_description': ' '.join(rng.choices(WORDS, k=40)),
+        'applied': 0,
+        'hidden': 0,
+        'interview': 0,
+        'rejected': 0,
+        'date_loaded': '2026-10-18 12:00:00',
+    }
+
+
+def synthetic_db(directory, rows, config):
+    # A jobs / filtered_jobs database with `rows` jobs, built once per size and shared by the database benchmarks
+    path = os.path.join(directory, f"bench_{rows}.db")
+    if os.path.exists(path):
+        return path
+    conn = sqlite3.connect(path)
+    create_schema(conn, config['jobs_tablename'])
+    create_search_index(conn, config['jobs_tablename'])
+    create_schema(conn, config['filtered_jobs_tablename'])
+    rng = random.Random(rows)
+    for start in range(0, rows, 50000):
+        jobs = [synthetic_job(i, rng) for i in range(start, min(rows, start + 50000))]
+        insert_jobs(conn, jobs, config['jobs_tablename'])
+    conn.close()
+    return path
+
+
+def measure(func):
+    # Run func twice: once for the wall clock time, once under tracemalloc for the peak memory
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = tm.perf_counter()
+        items = func()
+        seconds = tm.perf_counter() - start
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'items': items, 'seconds': seconds, 'items_per_second': items / seconds if seconds > 0 else 0.0, 'peak_mb': peak / 2**20}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, iterations=200, workdir=None):
+    # Run every benchmark and return {name: result}. Database benchmarks run once per database size.
+    results = {}
+    workdir = workdir or tempfile.mkdtemp(prefix='linkedinscraper_bench_')
+    search_content = search_page(0)
+    job_content = read_fixture('job_page.html')
+
+    def parse_search(backend):
+        def run():
+            for _ in range(iterations):
+                main.parse_cards(search_content, {'html_parser': backend})
+            return iterations
+        return run
+
+    def parse_job(backend):
+        def run():
+            for _ in range(iterations):
+                if backend == 'lxml':
+                    main.transform_job_lxml(job_content)
+                else:
+                    main.transform_job(BeautifulSoup(job_content, 'html.parser'))
+            return iterations
+        return run
+
+    backends = ['html.parser'] + (['lxml'] if main.lxml_html is not None else [])
+    for backend in backends:
+        results[f"transform[{backend}]"] = measure(parse_search(backend))
+        results[f"transform_job[{backend}]"] = measure(parse_job(backend))
+
+    with stub_server() as base_url:
+        config = bench_config(os.path.join(workdir, 'unused.db'), base_url)
+        # Start from fresh HTTP state, so limits set up by an earlier caller in the same process don't apply
+        main._host_limiter = None
+        main._rate_controllers.clear()
+        main._proxy_pool = None
+
+        def jobcards():
+            main.get_jobcards(config)
+            return len(config['search_queries']) * config['pages_to_scrape']
+        results['get_jobcards'] = measure(jobcards)
+
+    config = bench_config(os.path.join(workdir, 'unused.db'))
+    rng = random.Random(0)
+    for size in sizes:
+        jobs = [synthetic_job(i, rng) for i in range(size)]
+
+        def remove_irrelevant():
+            main.remove_irrelevant_jobs(jobs, config)
+            return len(jobs)
+        results[f"remove_irrelevant_jobs[{size}]"] = measure(remove_irrelevant)
+
+        config['db_path'] = synthetic_db(workdir, size, config)
+        # Half of the candidates are already in the database
+        candidates = [synthetic_job(i, rng) for i in range(size - 500, size + 500)]
+
+        def find_new():
+            conn = main.create_connection(config)
+            main.find_new_jobs(candidates, conn, config)
+            conn.close()
+            return len(candidates)
+        results[f"find_new_jobs[{size}]"] = measure(find_new)
+
+        def write():
+            # 1000 jobs that aren't in the database yet, with ids after every job written so far
+            first_id = next_job_id[0]
+            next_job_id[0] += 1000
+            new_jobs = [synthetic_job(i, rng) for i in range(first_id, first_id + 1000)]
+            conn = main.create_connection(config)
+            insert_jobs(conn, new_jobs, config['jobs_tablename'])
+            conn.close()
+            return len(new_jobs)
+        next_job_id = [10**9]
+        results[f"db_write[{size}]"] = measure(write)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Return the benchmarks whose throughput dropped more than tolerance below the baseline
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and baseline[name]['items_per_second'] > 0:
+            ratio = result['items_per_second'] / baseline[name]['items_per_second']
+            if ratio < 1 - tolerance:
+                regressions.append((name, ratio))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<34}{'items':>10}{'seconds':>10}{'items/s':>14}{'peak MB':>10}")
+    for name, result in results.items():
+        print(f"{name:<34}{result['items']:>10}{result['seconds']:>10.3f}{result['items_per_second']:>14.1f}{result['peak_mb']:>10.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the scraper's hot paths against recorded fixtures, offline")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="comma separated sizes of the synthetic databases, e.g. 1000,100000,1000000")
+    parser.add_argument('--iterations', type=int, default=200, help="pages parsed by the parsing benchmarks")
+    parser.add_argument('--workdir', help="directory for the synthetic databases, re-used between runs")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--baseline', help="results file of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed throughput drop against the baseline (default 0.2)")
+    args = parser.parse_args()
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+    results = run_benchmarks([int(size) for size in args.sizes.split(',')], args.iterations, args.workdir)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, ratio in regressions:
+            print(f"REGRESSION: {name} runs at {ratio:.0%} of the baseline throughput")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,230 @@
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Columns of the jobs and filtered_jobs tables that are moved to the job_blobs table when compressed storage is on
+COMPRESSED_COLUMNS = ('job_description', 'resume', 'cover_letter')
+# zlib only looks back 32 KB, a bigger preset dictionary would be wasted
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+ZSTD_DICTIONARY_SIZE = 64 * 1024
+ZSTD_LEVEL = 9
+# A dictionary is only trained once there are this many descriptions to learn from
+MIN_TRAINING_SAMPLES = 100
+MAX_TRAINING_SAMPLES = 2000
+
+def get_codec(name):
+    # "zstd" needs the zstandard package, without it the texts are compressed with zlib
+    if name == 'zstd' and zstandard is None:
+        print("zstandard is not installed (pip install zstandard), compressing with zlib instead")
+        return 'zlib'
+    if name not in ('zstd', 'zlib'):
+        raise ValueError(f"Unknown compression codec {name}, use zstd or zlib")
+    return name
+
+def blob_tables_exist(conn):
+    return conn.execute("SELECT count(*) FROM sqlite_master WHERE type='table' AND name='job_blobs'").fetchone()[0] == 1
+
+def create_blob_tables(conn, table_names):
+    # The compressed texts by table, job id and column, and the dictionaries they were compressed with. The blobs of a job
+    # are deleted with it.
+    conn.execute('''CREATE TABLE IF NOT EXISTS job_blobs (table_name TEXT, job_id INTEGER, column_name TEXT, codec TEXT,
+                    dict_id INTEGER, data BLOB, PRIMARY KEY (table_name, job_id, column_name))''')
+    conn.execute('CREATE TABLE IF NOT EXISTS compression_dicts (id INTEGER PRIMARY KEY AUTOINCREMENT, codec TEXT, dictionary BLOB, created TEXT)')
+    for table_name in table_names:
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS "{table_name}_blobs_delete" AFTER DELETE ON "{table_name}" BEGIN
+                DELETE FROM job_blobs WHERE table_name = '{table_name}' AND job_id = old.id;
+            END
+        ''')
+    conn.commit()
+
+def blob_sql(table_name, column, job_id):
+    # SQL expression of the decompressed text of a column, e.g. for job_id "old.id" in a trigger
+    return (f"(SELECT decompress_blob(codec, dict_id, data) FROM job_blobs WHERE table_name = '{table_name}' "
+            f"AND job_id = {job_id} AND column_name = '{column}')")
+
+def decompress(codec, dictionary, data):
+    if codec == 'zlib':
+        if dictionary is None:
+            return zlib.decompress(data).decode('utf-8')
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        return (decompressor.decompress(data) + decompressor.flush()).decode('utf-8')
+    if zstandard is None:
+        raise RuntimeError("The database has zstd compressed texts, install zstandard to read them: pip install zstandard")
+    dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None
+    return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data).decode('utf-8')
+
+def register_functions(conn):
+    # decompress_blob(codec, dict_id, data) for the SQL of this connection. Dictionaries never change once stored, each one
+    # is read once per connection.
+    dictionaries = {}
+
+    def decompress_blob(codec, dict_id, data):
+        if data is None:
+            return None
+        if dict_id is not None and dict_id not in dictionaries:
+            dictionaries[dict_id] = conn.execute('SELECT dictionary FROM compression_dicts WHERE id = ?', (dict_id,)).fetchone()[0]
+        return decompress(codec, dictionaries.get(dict_id), data)
+
+    conn.create_function('decompress_blob', 3, decompress_blob, deterministic=True)
+
+def read_blobs(conn, table_name, job):
+    # Fill in the columns of the job (a dict with its id) that are stored compressed
+    missing = [column for column in COMPRESSED_COLUMNS if column in job and job[column] is None]
+    if len(missing) == 0 or not blob_tables_exist(conn):
+        return job
+    rows = conn.execute('SELECT column_name, decompress_blob(codec, dict_id, data) FROM job_blobs WHERE table_name = ? AND job_id = ?',
+                        (table_name, job['id']))
+    for column, text in rows:
+        if column in missing:
+            job[column] = text
+    return job
+
+def train_zlib_dictionary(samples, size=ZLIB_DICTIONARY_SIZE):
+    # zlib has no dictionary trainer. Its preset dictionary works as text that precedes every description, so it's made of
+    # the lines most descriptions share (equal opportunity statements, benefits, "Show more"). The most valuable lines go
+    # last, closest to the data.
+    counts = Counter(line for sample in samples for line in set(sample.splitlines()) if len(line.strip()) > 20)
+    lines = sorted((line for line, count in counts.items() if count > 1), key=lambda line: counts[line] * len(line), reverse=True)
+    chosen = []
+    total = 0
+    for line in lines:
+        encoded = (line + '\n').encode('utf-8')
+        if total + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen)) or None
+
+def train_dictionary(codec, samples):
+    # A dictionary of what the texts have in common, or None if there's not enough to learn from
+    samples = [sample for sample in samples if sample]
+    if len(samples) < MIN_TRAINING_SAMPLES:
+        return None
+    if codec == 'zlib':
+        return train_zlib_dictionary(samples)
+    try:
+        return zstandard.train_dictionary(ZSTD_DICTIONARY_SIZE, [sample.encode('utf-8') for sample in samples]).as_bytes()
+    except zstandard.ZstdError as e:
+        print(f"Could not train a zstd dictionary: {e}")
+        return None
+
+class BlobStore:
+    # Moves the long text columns of jobs into compressed blobs in the job_blobs table, leaving NULL in the row. Texts are
+    # compressed with the newest dictionary of the codec, one is trained from the stored descriptions as soon as there are
+    # enough of them (see train_when_ready). Older blobs keep pointing to the dictionary they were compressed with.
+    def __init__(self, conn, codec, table_names, retrain=False):
+        self.conn = conn
+        self.codec = get_codec(codec)
+        self.table_names = table_names
+        # Descriptions found by the last training and written since, to know when there are enough to train again
+        self.samples_seen = 0
+        self.written = 0
+        create_blob_tables(conn, table_names)
+        row = conn.execute('SELECT id, dictionary FROM compression_dicts WHERE codec = ? ORDER BY id DESC LIMIT 1', (self.codec,)).fetchone()
+        self.dict_id, self.dictionary = row if row is not None else (None, None)
+        self.compressor = self.make_compressor()
+        if retrain or self.dict_id is None:
+            self.train()
+
+    def samples(self):
+        # Descriptions of the newest jobs, whether they're stored compressed or not
+        samples = []
+        for table_name in self.table_names:
+            description = f"COALESCE(job_description, {blob_sql(table_name, 'job_description', f'{table_name}.id')})"
+            rows = self.conn.execute(f'SELECT {description} FROM "{table_name}" ORDER BY id DESC LIMIT ?', (MAX_TRAINING_SAMPLES,))
+            samples.extend(row[0] for row in rows if row[0])
+        return samples[:MAX_TRAINING_SAMPLES]
+
+    def train(self):
+        # Train and store a new dictionary, used for everything compressed from now on. Returns False if there weren't
+        # enough descriptions yet.
+        samples = self.samples()
+        self.samples_seen, self.written = len(samples), 0
+        dictionary = train_dictionary(self.codec, samples)
+        if dictionary is None:
+            return False
+        with self.conn:
+            cursor = self.conn.execute('INSERT INTO compression_dicts (codec, dictionary, created) VALUES (?, ?, ?)',
+                                       (self.codec, dictionary, str(datetime.now())))
+        self.dict_id, self.dictionary = cursor.lastrowid, dictionary
+        self.compressor = self.make_compressor()
+        return True
+
+    def train_when_ready(self):
+        # Train the first dictionary once enough descriptions were written since the last try. Commits, so it's called
+        # between transactions.
+        if self.dict_id is None and self.samples_seen + self.written >= MIN_TRAINING_SAMPLES:
+            self.train()
+
+    def make_compressor(self):
+        if self.codec == 'zstd':
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary is not None else None
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data)
+        return None
+
+    def compress(self, text):
+        data = text.encode('utf-8')
+        if self.codec == 'zstd':
+            return self.compressor.compress(data)
+        if self.dictionary is None:
+            return zlib.compress(data, 9)
+        compressor = zlib.compressobj(9, zdict=self.dictionary)
+        return compressor.compress(data) + compressor.flush()
+
+    def write_blobs(self, table_name, job_id, texts):
+        # Compress the texts of the job, a dict by column, into job_blobs. Not committed, the caller commits together with the row.
+        for column, text in texts.items():
+            if text is None:
+                continue
+            if column == 'job_description' and text:
+                self.written += 1
+            self.conn.execute('''INSERT OR REPLACE INTO job_blobs (table_name, job_id, column_name, codec, dict_id, data)
+                                 VALUES (?, ?, ?, ?, ?, ?)''', (table_name, job_id, column, self.codec, self.dict_id, self.compress(text)))
+
+    def compress_rows(self, table_name, where='', params=(), chunk_size=500):
+        # Move the texts of the rows matching where into job_blobs, chunk by chunk. Returns the number of rows compressed.
+        columns = ', '.join(f'"{column}"' for column in COMPRESSED_COLUMNS)
+        not_null = ' OR '.join(f'"{column}" IS NOT NULL' for column in COMPRESSED_COLUMNS)
+        clear = ', '.join(f'"{column}" = NULL' for column in COMPRESSED_COLUMNS)
+        conditions = f"({not_null})" + (f" AND ({where})" if where else '')
+        last_id = 0
+        count = 0
+        while True:
+            rows = self.conn.execute(f'SELECT id, {columns} FROM "{table_name}" WHERE {conditions} AND id > ? ORDER BY id LIMIT ?',
+                                     list(params) + [last_id, chunk_size]).fetchall()
+            if len(rows) == 0:
+                return count
+            with self.conn:
+                for job_id, *texts in rows:
+                    self.write_blobs(table_name, job_id, dict(zip(COMPRESSED_COLUMNS, texts)))
+                    self.conn.execute(f'UPDATE "{table_name}" SET {clear} WHERE id = ?', (job_id,))
+            count += len(rows)
+            last_id = rows[-1][0]
+
+# BlobStores by connection, codec and tables. Each connection keeps its store (and the compressor and dictionary loaded in
+# it) for the life of the process, instead of loading them, or trying to train a dictionary, for every batch.
+_stores = {}
+_stores_lock = threading.Lock()
+
+def shared_store(conn, codec, table_names, retrain=False):
+    # The BlobStore of the connection, created on first use. retrain trains a new dictionary even if there is one.
+    key = (id(conn), codec, tuple(table_names))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            # The store keeps the connection alive, so its id can't be taken by another connection
+            store = _stores[key] = BlobStore(conn, codec, table_names, retrain)
+            return store
+    if retrain:
+        store.train()
+    else:
+        store.train_when_ready()
+    return store
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+
+from db import create_connection
+
+
+class Checkpoint:
+    # Progress of the current scrape run, kept in the SQLite database so an interrupted run can pick up where it stopped.
+    # While job cards are collected every finished search result page is saved with its cards, and every new job found on
+    # them is saved as pending. Each pending job is updated as soon as its description is downloaded and removed once it is
+    # written to the jobs or filtered_jobs table. Pages are saved from the scraping threads, so every access goes through the lock.
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.conn = create_connection(config, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS checkpoint_state (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS checkpoint_pages (round INTEGER, url TEXT, cards TEXT, PRIMARY KEY (round, url))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS checkpoint_jobs (job_url TEXT PRIMARY KEY, job TEXT)')
+        self.conn.commit()
+        state = dict(self.conn.execute('SELECT key, value FROM checkpoint_state'))
+        if state and self.matches(state):
+            self.stage = state.get('stage', 'cards')
+        else:
+            if state:
+                print("Discarding the checkpoint of an earlier run, it is too old or the search queries have changed")
+            self.reset()
+
+    def fingerprint(self):
+        # Search result pages of a checkpoint are only re-used for the same searches
+        searches = [self.config['search_queries'], self.config['timespan'], self.config['rounds'], self.config['pages_to_scrape']]
+        return hashlib.sha256(json.dumps(searches, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def matches(self, state):
+        max_age = timedelta(hours=self.config.get('checkpoint_max_age_hours', 24))
+        try:
+            started = datetime.fromisoformat(state.get('started', ''))
+        except ValueError:
+            return False
+        return datetime.now() - started <= max_age and state.get('fingerprint') == self.fingerprint()
+
+    def reset(self):
+        with self.lock, self.conn:
+            for table in ('checkpoint_state', 'checkpoint_pages', 'checkpoint_jobs'):
+                self.conn.execute(f'DELETE FROM {table}')
+            self.conn.executemany('INSERT INTO checkpoint_state (key, value) VALUES (?, ?)',
+                                  [('started', datetime.now().isoformat()), ('fingerprint', self.fingerprint()), ('stage', 'cards')])
+        self.stage = 'cards'
+
+    def page(self, round_number, url):
+        # The job cards of a search result page finished by the interrupted run, or None
+        with self.lock:
+            row = self.conn.execute('SELECT cards FROM checkpoint_pages WHERE round = ? AND url = ?', (round_number, url)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save_page(self, round_number, url, cards):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO checkpoint_pages (round, url, cards) VALUES (?, ?, ?)',
+                              (round_number, url, json.dumps(cards)))
+
+    def add_pending(self, job):
+        # A new job found while the job cards are still being collected. If the interrupted run already downloaded its
+        # description, that copy is returned, so it isn't downloaded again.
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO checkpoint_jobs (job_url, job) VALUES (?, ?)', (job['job_url'], json.dumps(job)))
+            row = self.conn.execute('SELECT job FROM checkpoint_jobs WHERE job_url = ?', (job['job_url'],)).fetchone()
+        return json.loads(row[0])
+
+    def cards_done(self):
+        # Job cards are done: only the pending jobs are left to resume, the pages aren't needed anymore
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM checkpoint_pages')
+            self.conn.execute("UPDATE checkpoint_state SET value = 'descriptions' WHERE key = 'stage'")
+        self.stage = 'descriptions'
+
+    def pending_jobs(self):
+        # Jobs of the interrupted run that aren't in the database yet. The ones with a job_description were already downloaded.
+        with self.lock:
+            return [json.loads(row[0]) for row in self.conn.execute('SELECT job FROM checkpoint_jobs ORDER BY rowid')]
+
+    def save_job(self, job):
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE checkpoint_jobs SET job = ? WHERE job_url = ?', (json.dumps(job), job['job_url']))
+
+    def finish_jobs(self, jobs):
+        # The jobs are written to the database, they don't need to be resumed anymore
+        with self.lock, self.conn:
+            self.conn.executemany('DELETE FROM checkpoint_jobs WHERE job_url = ?', [(job['job_url'],) for job in jobs])
+
+    def clear(self):
+        # The run finished, the next one starts from scratch
+        with self.lock, self.conn:
+            for table in ('checkpoint_state', 'checkpoint_pages', 'checkpoint_jobs'):
+                self.conn.execute(f'DELETE FROM {table}')
+        self.close()
+
+    def close(self):
+        self.conn.close()
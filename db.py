@@ -0,0 +1,291 @@
+import queue
+import sqlite3
+import threading
+from itertools import groupby
+from sqlite3 import Error
+
+from blob_store import COMPRESSED_COLUMNS, blob_sql, blob_tables_exist, register_functions
+
+
+# Columns of the jobs and filtered_jobs tables, in addition to the id primary key
+JOB_COLUMNS = {
+    'title': 'TEXT',
+    'company': 'TEXT',
+    'location': 'TEXT',
+    'date': 'TEXT',
+    'job_url': 'TEXT',
+    'job_description': 'TEXT',
+    'language': 'TEXT',
+    'applied': 'INTEGER DEFAULT 0',
+    'hidden': 'INTEGER DEFAULT 0',
+    'interview': 'INTEGER DEFAULT 0',
+    'rejected': 'INTEGER DEFAULT 0',
+    'date_loaded': 'TEXT',
+    'cover_letter': 'TEXT',
+    'resume': 'TEXT',
+    'last_modified': 'TEXT',
+    'filter_reason': 'TEXT',
+}
+
+def configure_connection(conn, config):
+    # WAL journal mode lets the dashboard keep reading while the scraper writes. It is stored in the database file, the other
+    # pragmas are per connection.
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f"PRAGMA cache_size={-int(config.get('sqlite_cache_size_kb', 20000))}")
+    conn.execute(f"PRAGMA mmap_size={int(config.get('sqlite_mmap_size_mb', 256)) * 1024 * 1024}")
+    conn.execute(f"PRAGMA busy_timeout={int(config.get('sqlite_busy_timeout_ms', 5000))}")
+
+def create_connection(config, check_same_thread=True):
+    # Create a database connection to a SQLite database
+    conn = None
+    path = config['db_path']
+    try:
+        conn = sqlite3.connect(path, check_same_thread=check_same_thread) # creates a SQL database in the 'data' directory
+        configure_connection(conn, config)
+        register_functions(conn)
+    except Error as e:
+        print(e)
+
+    return conn
+
+class ConnectionPool:
+    # A per-process pool of tuned SQLite connections. Connections are handed to one thread at a time, so they are opened with
+    # check_same_thread=False. get() blocks when all config['db_pool_size'] connections are in use.
+    def __init__(self, config):
+        self.config = config
+        self.size = config.get('db_pool_size', 5)
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+
+    def get(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+        if create:
+            conn = create_connection(self.config, check_same_thread=False)
+            if conn is None:
+                with self.lock:
+                    self.created -= 1
+                raise Error(f"Cannot open the database {self.config['db_path']}")
+            return conn
+        return self.idle.get()
+
+    def put(self, conn):
+        # Roll back whatever the borrower left uncommitted, so the next one starts clean
+        if conn.in_transaction:
+            conn.rollback()
+        self.idle.put(conn)
+
+def table_exists(conn, table_name):
+    # Check if the table already exists in the database
+    cur = conn.cursor()
+    cur.execute("SELECT count(name) FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+    if cur.fetchone()[0]==1 :
+        return True
+    return False
+
+def create_schema(conn, table_name):
+    # Create the jobs table with its indexes if it doesn't exist yet. Tables created by older versions are brought up to date
+    # by adding the missing columns.
+    columns_with_types = ', '.join(f'"{column}" {column_type}' for column, column_type in JOB_COLUMNS.items())
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns_with_types})')
+    existing_columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+    for column, column_type in JOB_COLUMNS.items():
+        if column not in existing_columns:
+            conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{column}" {column_type}')
+            print(f"Added {column} column to {table_name} table")
+    # Stamp every update of a row, so cached copies of it (like the rendered job pages) can tell they are stale
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS "{table_name}_last_modified" AFTER UPDATE ON "{table_name}"
+        FOR EACH ROW WHEN NEW.last_modified IS OLD.last_modified
+        BEGIN
+            UPDATE "{table_name}" SET last_modified = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
+        END
+    ''')
+    conn.commit()
+    ensure_dedup_indexes(conn, table_name)
+    ensure_listing_indexes(conn, table_name)
+
+def ensure_dedup_indexes(conn, table_name):
+    # Create the indexes backing the dedup lookups on job_url and on (title, company, date). Older databases can already hold
+    # duplicate rows, in that case a plain index is created instead of the unique one.
+    indexes = ((f"idx_{table_name}_job_url", "job_url"), (f"idx_{table_name}_title_company_date", "title, company, date"))
+    for index_name, columns in indexes:
+        try:
+            conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({columns})')
+        except sqlite3.IntegrityError:
+            print(f"Duplicate rows found in the {table_name} table, creating a non-unique index on {columns}")
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({columns})')
+    conn.commit()
+
+def ensure_listing_indexes(conn, table_name):
+    # Indexes for the paginated job list of the web interface: every status filter combined with the id order, and the posting date
+    for column in ('hidden', 'applied', 'interview', 'rejected'):
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_{column}_id" ON "{table_name}" ({column}, id)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_date" ON "{table_name}" (date)')
+    conn.commit()
+
+# Columns of the full-text index, searched with these bm25 weights: a match in the title counts most
+SEARCH_COLUMNS = {'title': 10.0, 'company': 5.0, 'location': 2.0, 'job_description': 1.0}
+
+def search_columns_sql(prefix, table_name, compressed, aliases=False):
+    # The values of SEARCH_COLUMNS for a trigger or view, e.g. "new.title, new.company, ...". Compressed descriptions are
+    # read from job_blobs.
+    values = []
+    for column in SEARCH_COLUMNS:
+        if compressed and column == 'job_description':
+            value = f"COALESCE({prefix}.{column}, {blob_sql(table_name, column, f'{prefix}.id')})"
+        else:
+            value = f"{prefix}.{column}"
+        values.append(f"{value} AS {column}" if aliases else value)
+    return ', '.join(values)
+
+def drop_search_triggers(conn, table_name):
+    for trigger in ('insert', 'delete', 'update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS "{table_name}_fts_{trigger}"')
+
+def drop_search_index(conn, table_name):
+    drop_search_triggers(conn, table_name)
+    conn.execute(f'DROP TABLE IF EXISTS "{table_name}_fts"')
+    conn.execute(f'DROP VIEW IF EXISTS "{table_name}_text"')
+    conn.commit()
+
+def create_search_index(conn, table_name):
+    # Full-text index of the table in an FTS5 table that reads the text from the table itself (external content), so the
+    # descriptions aren't stored twice. Triggers keep it in sync with every insert, update and delete. The index of an
+    # existing table is built once, when it's created. Returns False if this SQLite build has no FTS5.
+    # Once the database has compressed texts (see blob_store.py) the index reads them through the {table_name}_text view,
+    # which decompresses the descriptions stored in job_blobs. Triggers can't decompress them without the decompress_blob
+    # function of this code's connections, and would break every write of other SQLite clients, so insert_jobs indexes the
+    # new jobs instead. The index is rebuilt when it switches to the view, and when other programs added or deleted jobs.
+    fts_table = f"{table_name}_fts"
+    columns = ', '.join(SEARCH_COLUMNS)
+    compressed = blob_tables_exist(conn)
+    content_table = f"{table_name}_text" if compressed else table_name
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (fts_table,)).fetchone()
+    if row is not None and f'content="{content_table}"' not in row[0]:
+        drop_search_index(conn, table_name)
+        row = None
+    if compressed:
+        conn.execute(f'''CREATE VIEW IF NOT EXISTS "{content_table}" AS
+                         SELECT id, {search_columns_sql(f'"{table_name}"', table_name, compressed, aliases=True)} FROM "{table_name}"''')
+    try:
+        conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS "{fts_table}" USING fts5({columns}, content="{content_table}",
+                         content_rowid="id", tokenize="porter unicode61")''')
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search is not available: {e}")
+        return False
+    if compressed:
+        drop_search_triggers(conn, table_name)
+        if row is not None:
+            # Ids are never re-used, so any insert or delete changes the count or the highest id of the table
+            indexed = conn.execute(f'SELECT count(*), max(id) FROM "{fts_table}_docsize"').fetchone()
+            if indexed != conn.execute(f'SELECT count(*), max(id) FROM "{table_name}"').fetchone():
+                print(f"Jobs were added to or deleted from the {table_name} table by another program")
+                row = None
+    else:
+        create_search_triggers(conn, table_name)
+    if row is None:
+        print(f"Building the full-text index of the {table_name} table")
+        conn.execute(f'''INSERT INTO "{fts_table}" ("{fts_table}") VALUES ('rebuild')''')
+    conn.commit()
+    return True
+
+def create_search_triggers(conn, table_name):
+    # Triggers keeping the full-text index of a table without compressed texts in sync
+    fts_table = f"{table_name}_fts"
+    columns = ', '.join(SEARCH_COLUMNS)
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_insert" AFTER INSERT ON "{table_name}" BEGIN
+            INSERT INTO "{fts_table}" (rowid, {columns}) VALUES (new.id, {search_columns_sql('new', table_name, False)});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_delete" AFTER DELETE ON "{table_name}" BEGIN
+            INSERT INTO "{fts_table}" ("{fts_table}", rowid, {columns}) VALUES ('delete', old.id, {search_columns_sql('old', table_name, False)});
+        END
+    ''')
+    # Only changes of the indexed columns touch the index, marking a job as applied or hidden doesn't
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS "{table_name}_fts_update" AFTER UPDATE OF {columns} ON "{table_name}" BEGIN
+            INSERT INTO "{fts_table}" ("{fts_table}", rowid, {columns}) VALUES ('delete', old.id, {search_columns_sql('old', table_name, False)});
+            INSERT INTO "{fts_table}" (rowid, {columns}) VALUES (new.id, {search_columns_sql('new', table_name, False)});
+        END
+    ''')
+
+def indexed_in_python(conn, table_name):
+    # True if new jobs of the table have to be added to its full-text index by insert_jobs, see create_search_index
+    fts_table = f"{table_name}_fts"
+    return blob_tables_exist(conn) and conn.execute("SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?",
+                                                    (fts_table,)).fetchone()[0] == 1
+
+def create_llm_cache(conn):
+    # Answers of the language model by hash of the model and prompt, so the same prompt is never paid for twice
+    conn.execute('CREATE TABLE IF NOT EXISTS llm_cache (prompt_hash TEXT PRIMARY KEY, model TEXT, response TEXT, created TEXT)')
+    conn.commit()
+
+def insert_jobs(conn, jobs, table_name, store=None):
+    # Insert the jobs in a single transaction. Jobs that are already in the table (same job_url, or same title, company and
+    # date) are skipped by the unique indexes. Returns the number of rows added.
+    # Every job is written with the columns it has, the others get their default. Jobs that follow each other with the same
+    # columns share one statement, so a batch keeps its order.
+    # With a BlobStore the long texts are compressed into job_blobs as the rows are written, and never stored in the row.
+    # Databases with compressed texts get the new jobs added to their full-text index here (see create_search_index).
+    if len(jobs) == 0:
+        return 0
+    runs = [(columns, list(run))
+            for columns, run in groupby(jobs, key=lambda job: tuple(column for column in JOB_COLUMNS if column in job))]
+
+    def insert_sql(columns):
+        return f'''
+            INSERT OR IGNORE INTO "{table_name}" ({', '.join(f'"{column}"' for column in columns)})
+            VALUES ({', '.join(['?' for _ in columns])})
+        '''
+
+    index = indexed_in_python(conn, table_name)
+    if store is None and not index:
+        # The row count of the statement itself, total_changes would also count the rows the triggers write to the search index
+        added = 0
+        with conn:
+            for columns, run in runs:
+                added += conn.executemany(insert_sql(columns), [[job.get(column) for column in columns] for job in run]).rowcount
+        return added
+    compressed = COMPRESSED_COLUMNS if store is not None else ()
+    added = []
+    with conn:
+        for columns, run in runs:
+            sql = insert_sql(columns)
+            for job in run:
+                cursor = conn.execute(sql, [None if column in compressed else job.get(column) for column in columns])
+                if cursor.rowcount == 0:
+                    continue
+                added.append((cursor.lastrowid, job))
+                if store is not None:
+                    store.write_blobs(table_name, cursor.lastrowid, {column: job.get(column) for column in compressed})
+        if index:
+            fts_table = f"{table_name}_fts"
+            conn.executemany(f'''INSERT INTO "{fts_table}" (rowid, {', '.join(SEARCH_COLUMNS)})
+                                 VALUES (?, {', '.join(['?' for _ in SEARCH_COLUMNS])})''',
+                             [[job_id] + [job.get(column) for column in SEARCH_COLUMNS] for job_id, job in added])
+    return len(added)
+
+def load_job_keys(conn, config):
+    # Load the dedup keys of all jobs in the jobs and filtered_jobs tables into hash sets: one with the job URLs and one with
+    # the (title, company, date) tuples. Only the key columns are read, never the descriptions or the generated documents.
+    job_urls = set()
+    job_keys = set()
+    if conn is None:
+        return job_urls, job_keys
+    for table_name in (config['jobs_tablename'], config['filtered_jobs_tablename']):
+        if table_exists(conn, table_name):
+            for job_url, title, company, date in conn.execute(f'SELECT job_url, title, company, date FROM "{table_name}"'):
+                job_urls.add(job_url)
+                job_keys.add((title, company, date))
+    return job_urls, job_keys
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+import time as tm
+
+
+# Default time to live in seconds of the cached pages, by type of URL. Search results change quickly, job descriptions rarely do.
+DEFAULT_TTLS = {
+    'search': 3600,
+    'job': 7 * 24 * 3600,
+    'other': 3600,
+}
+
+def url_type(url):
+    # The type of page behind a LinkedIn URL, used to pick its time to live
+    if 'seeMoreJobPostings' in url:
+        return 'search'
+    if '/jobs/view/' in url:
+        return 'job'
+    return 'other'
+
+class ResponseCache:
+    # On-disk cache of page bodies. Every page is stored in a file named after the sha256 of its URL, the file's modification
+    # time is when it was downloaded and its access time is when it was last read, which drives the LRU eviction once the
+    # cache grows over max_bytes.
+    def __init__(self, directory, max_bytes, ttls):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **ttls)
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(path) for path in self._files())
+
+    def _files(self):
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.html'):
+                    yield os.path.join(root, name)
+
+    def path(self, url):
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.html')
+
+    def get(self, url, ignore_ttl=False):
+        # Return the cached page, or None if it isn't cached or has expired
+        path = self.path(url)
+        try:
+            stat = os.stat(path)
+            if not ignore_ttl and tm.time() - stat.st_mtime > self.ttls[url_type(url)]:
+                return None
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path, (tm.time(), stat.st_mtime))
+            return content
+        except FileNotFoundError:
+            return None
+
+    def put(self, url, content):
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so a page is never read half written
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        with self.lock:
+            try:
+                self.size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self.size += len(content)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        # Remove the least recently read pages until the cache is back under 90% of max_bytes
+        files = sorted(self._files(), key=lambda path: os.stat(path).st_atime)
+        for path in files:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.size -= size
+            except FileNotFoundError:
+                pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache(config):
+    # The cache shared by every request of the process, or None if config['cache_dir'] isn't set
+    global _cache
+    if not config.get('cache_dir'):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            max_bytes = int(config.get('cache_max_mb', 500)) * 1024 * 1024
+            _cache = ResponseCache(config['cache_dir'], max_bytes, config.get('cache_ttls', {}))
+        return _cache
@@ -1,16 +1,41 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
-import sqlite3
-import sys
-from sqlite3 import Error
+import argparse
+import os
+import multiprocessing
+import threading
+import random
+import re
+import hashlib
+import importlib.util
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from queue import Queue
 from bs4 import BeautifulSoup
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    lxml_html = None
 import time as tm
-from itertools import groupby
-from datetime import datetime, timedelta, time
+from collections import Counter
+from functools import lru_cache
+from datetime import datetime, timedelta, time, timezone
+from email.utils import parsedate_to_datetime
 import pandas as pd
-from urllib.parse import quote
-from langdetect import detect
+from urllib.parse import quote, urlparse
+from langdetect import detect, DetectorFactory
+from langdetect.detector_factory import init_factory
 from langdetect.lang_detect_exception import LangDetectException
+from http_cache import get_response_cache, url_type
+from db import create_connection, create_schema, create_search_index, drop_search_index, insert_jobs, load_job_keys
+from blob_store import create_blob_tables, shared_store
+from metrics import get_metrics, reset_metrics
+from checkpoint import Checkpoint
+from scheduler import QuerySchedule, timespan_seconds
+from work_queue import WorkQueue
+from proxy_pool import ProxyPool, proxy_list
+from near_dup import NearDuplicateIndex
 
 
 def load_config(file_name):
@@ -18,20 +43,241 @@ def load_config(file_name):
     with open(file_name) as f:
         return json.load(f)
 
-def get_with_retry(url, config, retries=3, delay=1):
-    # Get the URL with retries and delay
-    for i in range(retries):
+class HostLimiter:
+    # Limits the number of in-flight requests per host and spaces out consecutive requests to the same host
+    # by the politeness delay, so that concurrent fetching doesn't hammer a single host.
+    def __init__(self, max_per_host, delay):
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_slot = {}
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            semaphore = self.semaphores[host]
+        with semaphore:
+            with self.lock:
+                now = tm.monotonic()
+                start = max(now, self.next_slot.get(host, now))
+                self.next_slot[host] = start + self.delay
+            if start > now:
+                tm.sleep(start - now)
+            yield
+
+_host_limiter = None
+_host_limiter_lock = threading.Lock()
+
+def get_host_limiter(config):
+    # One limiter is shared by every request made in this process
+    global _host_limiter
+    with _host_limiter_lock:
+        if _host_limiter is None:
+            concurrency = config.get('concurrency', 1)
+            _host_limiter = HostLimiter(config.get('per_host_concurrency', concurrency), config.get('request_delay', 0))
+        return _host_limiter
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session(config):
+    # One pooled session is shared by the card and description fetching, so connections are kept alive and reused
+    # instead of paying a new TCP and TLS handshake for every page.
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = config.get('pool_size', max(10, config.get('concurrency', 1)))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(config['headers'])
+            # The proxy is picked by the proxy pool for every request
+            _session = session
+        return _session
+
+_proxy_pool = None
+_proxy_pool_lock = threading.Lock()
+
+def get_proxy_pool(config):
+    # One pool of the proxies in config['proxies'] is shared by every request made in this process
+    global _proxy_pool
+    with _proxy_pool_lock:
+        if _proxy_pool is None:
+            _proxy_pool = ProxyPool(proxy_list(config['proxies']), config.get('proxy_strategy', 'round_robin'),
+                                    config.get('proxy_quarantine_after', 3), config.get('proxy_quarantine_seconds', 300))
+        return _proxy_pool
+
+def report_proxies(config):
+    # Print the health of every proxy in the pool and add it to the run report
+    report = get_proxy_pool(config).report()
+    get_metrics().set_detail('proxies', report)
+    for proxy in report:
+        latency = f"{proxy['latency_seconds']:.2f}s" if proxy['latency_seconds'] is not None else "-"
+        print(f"Proxy {proxy['proxy']}: {proxy['requests']} requests, {proxy['successes']} ok, {proxy['blocks']} blocked, "
+              f"{proxy['timeouts']} timeouts, {proxy['errors']} errors, latency {latency}, quarantined {proxy['quarantines']} times")
+
+def get_connection_stats():
+    # Count the requests made and the connections opened by the shared session's connection pools
+    stats = {'requests': 0, 'connections': 0}
+    if _session is None:
+        return stats
+    for adapter in set(_session.adapters.values()):
+        for manager in [adapter.poolmanager] + list(adapter.proxy_manager.values()):
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is not None:
+                    stats['requests'] += pool.num_requests
+                    stats['connections'] += pool.num_connections
+    return stats
+
+# LinkedIn answers with 429 or its own 999 status when it wants the client to slow down
+THROTTLE_STATUSES = {429, 999}
+
+class RateController:
+    # Token bucket for one proxy (or the direct connection) with an adaptive rate. The rate is halved whenever LinkedIn
+    # starts throttling and grows back a little with every successful request, so it settles just below the highest rate
+    # that doesn't get blocked. A throttled response also pauses every request going through the same proxy.
+    def __init__(self, rate, min_rate):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = tm.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = tm.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            tm.sleep(wait)
+
+    def throttle(self, pause):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, tm.monotonic() + pause)
+            return self.rate
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+_rate_controllers = {}
+_rate_controllers_lock = threading.Lock()
+
+def get_rate_controller(config, proxies):
+    # Every proxy gets its own rate controller, requests without a proxy share the 'direct' one
+    key = proxies.get('https') or proxies.get('http') or 'direct'
+    with _rate_controllers_lock:
+        if key not in _rate_controllers:
+            _rate_controllers[key] = RateController(config.get('rate_limit', 5), config.get('min_rate', 0.2))
+        return _rate_controllers[key]
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, delay, config):
+    # Exponential backoff with full jitter, capped at config['backoff_max'] seconds
+    return random.uniform(0, min(config.get('backoff_max', 60), delay * 2 ** attempt))
+
+def fetch_html(url, config, retries=None, delay=None):
+    # Get the raw page content of the URL. Timeouts, connection errors and 5xx responses are retried with exponential backoff.
+    # Throttled responses (429/999) slow down the proxy's rate controller and are retried after Retry-After if LinkedIn sent one.
+    # Returns None if the page couldn't be retrieved.
+    # Job pages in the response cache are served from disk. Search result pages are only stored: a new round or a new run
+    # has to see the jobs posted since. In replay mode nothing is downloaded, every page comes from the cache.
+    metrics = get_metrics()
+    cache = get_response_cache(config)
+    replay = config.get('replay', False)
+    if cache is not None and (replay or url_type(url) != 'search'):
+        content = cache.get(url, ignore_ttl=replay)
+        if content is not None:
+            metrics.count('cache_hits')
+            metrics.count('bytes_from_cache', len(content))
+            return content
+    if replay:
+        print(f"Replay mode: URL is not in the cache: {url}")
+        return None
+    retries = config.get('max_retries', 3) if retries is None else retries
+    delay = config.get('backoff_base', 1) if delay is None else delay
+    limiter = get_host_limiter(config)
+    session = get_session(config)
+    pool = get_proxy_pool(config)
+    for attempt in range(retries):
+        wait = backoff_delay(attempt, delay, config)
+        if attempt > 0:
+            metrics.count('retries')
+        # Every attempt picks a proxy again, so a retry doesn't go back to a proxy that just got blocked
+        proxy = pool.choose()
+        controller = get_rate_controller(config, proxy.proxies)
+        latency = None
         try:
-            if len(config['proxies']) > 0:
-                r = requests.get(url, headers=config['headers'], proxies=config['proxies'], timeout=5)
-            else:
-                r = requests.get(url, headers=config['headers'], timeout=5)
-            return BeautifulSoup(r.content, 'html.parser')
+            controller.acquire()
+            with limiter.slot(url):
+                # Only the request itself is timed, not the wait for the rate controller and the host limiter
+                request_start = tm.perf_counter()
+                try:
+                    r = session.get(url, timeout=5, proxies=proxy.proxies)
+                finally:
+                    latency = tm.perf_counter() - request_start
+                    metrics.observe('request_duration_seconds', latency)
+                    metrics.count('requests')
         except requests.exceptions.Timeout:
-            print(f"Timeout occurred for URL: {url}, retrying in {delay}s...")
-            tm.sleep(delay)
+            pool.record(proxy, 'timeout')
+            metrics.count('request_errors')
+            print(f"Timeout occurred for URL: {url}, retrying in {wait:.1f}s...")
         except Exception as e:
-            print(f"An error occurred while retrieving the URL: {url}, error: {e}")
+            pool.record(proxy, 'error')
+            metrics.count('request_errors')
+            print(f"An error occurred while retrieving the URL: {url}, error: {e}, retrying in {wait:.1f}s...")
+        else:
+            metrics.count('bytes_downloaded', len(r.content))
+            pool.record(proxy, 'blocked' if r.status_code in THROTTLE_STATUSES else 'ok', latency)
+            if r.status_code in THROTTLE_STATUSES:
+                metrics.count('throttled')
+                retry_after = parse_retry_after(r.headers.get('Retry-After'))
+                pause = retry_after if retry_after is not None else wait
+                rate = controller.throttle(pause)
+                print(f"Rate limited (HTTP {r.status_code}) for URL: {url}, slowing down to {rate:.2f} requests/s and retrying in {pause:.1f}s...")
+                # The rate controller holds back the next attempt for the pause
+                continue
+            if r.status_code >= 500:
+                metrics.count('server_errors')
+                print(f"Server error (HTTP {r.status_code}) for URL: {url}, retrying in {wait:.1f}s...")
+            else:
+                controller.recover()
+                if cache is not None and r.status_code == 200:
+                    cache.put(url, r.content)
+                return r.content
+        if attempt < retries - 1:
+            tm.sleep(wait)
+    metrics.count('failed_urls')
+    print(f"Giving up on URL: {url} after {retries} attempts")
     return None
 
 def transform(soup):
@@ -91,27 +337,272 @@ def transform_job(soup):
     else:
         return "Could not find Job Description"
 
+def _class_xpath(tag, class_name):
+    # XPath matching a tag that has class_name among its classes, like BeautifulSoup's class_ argument
+    return f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+@lru_cache(maxsize=None)
+def _lxml_xpaths():
+    # Compiled once per process, only the nodes transform and transform_job look at are selected
+    return {
+        'card_info': etree.XPath(_class_xpath('div', 'base-search-card__info')),
+        'title': etree.XPath('.//h3'),
+        'company': etree.XPath(_class_xpath('a', 'hidden-nested-link')),
+        'location': etree.XPath(_class_xpath('span', 'job-search-card__location')),
+        'date_new': etree.XPath(_class_xpath('time', 'job-search-card__listdate--new')),
+        'date': etree.XPath(_class_xpath('time', 'job-search-card__listdate')),
+        'description': etree.XPath(".//div[normalize-space(@class)='description__text description__text--rich']"),
+    }
+
+def _lxml_root(content):
+    # LinkedIn serves UTF-8, libxml2 would otherwise assume latin-1 for pages without a charset
+    return lxml_html.document_fromstring(content, parser=lxml_html.HTMLParser(encoding='utf-8'))
+
+def transform_lxml(content):
+    # Same job cards as transform, read straight from the lxml tree of the raw page
+    joblist = []
+    if content is None:
+        print("Empty page, no jobs found")
+        return joblist
+    if not content.strip():
+        return joblist
+    xpaths = _lxml_xpaths()
+    for item in xpaths['card_info'](_lxml_root(content)):
+        title = xpaths['title'](item)[0].text_content().strip()
+        company = xpaths['company'](item)
+        location = xpaths['location'](item)
+        entity_urn = item.getparent().get('data-entity-urn')
+        job_posting_id = entity_urn.split(':')[-1]
+        job_url = 'https://www.linkedin.com/jobs/view/'+job_posting_id+'/'
+
+        date_tag_new = xpaths['date_new'](item)
+        date_tag = xpaths['date'](item)
+        date = date_tag[0].get('datetime') if date_tag else date_tag_new[0].get('datetime') if date_tag_new else ''
+        job = {
+            'title': title,
+            'company': company[0].text_content().strip().replace('\n', ' ') if company else '',
+            'location': location[0].text_content().strip() if location else '',
+            'date': date,
+            'job_url': job_url,
+            'job_description': '',
+            'applied': 0,
+            'hidden': 0,
+            'interview': 0,
+            'rejected': 0
+        }
+        joblist.append(job)
+    return joblist
+
+# BeautifulSoup replaces strings made only of ASCII whitespace with a single '\n' (or ' ' if there's no newline in them),
+# except inside pre and textarea
+_ASCII_SPACES = str.maketrans('', '', '\x20\x0a\x09\x0c\x0d')
+
+def _soup_string(text, preserve_whitespace):
+    if preserve_whitespace or text.translate(_ASCII_SPACES) != '':
+        return text
+    return '\n' if '\n' in text else ' '
+
+def _description_strings(element, ul_depth, preserve_whitespace, strings):
+    # Collect the text of the description the way transform_job sees it: span and a elements are dropped (their tail text
+    # is kept), comments, scripts and styles are ignored and every li starts with one '-' per ul it is nested in.
+    if element.tag == 'li':
+        strings.extend(['-'] * ul_depth)
+    preserve_whitespace = preserve_whitespace or element.tag in ('pre', 'textarea')
+    if element.text:
+        strings.append(_soup_string(element.text, preserve_whitespace))
+    child_depth = ul_depth + 1 if element.tag == 'ul' else ul_depth
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in ('span', 'a', 'script', 'style', 'template'):
+            _description_strings(child, child_depth, preserve_whitespace, strings)
+        if child.tail:
+            strings.append(_soup_string(child.tail, preserve_whitespace))
+
+def transform_job_lxml(content):
+    # Same description text as transform_job, without building a beautiful soup tree of the whole page
+    if not content or not content.strip():
+        return "Could not find Job Description"
+    divs = _lxml_xpaths()['description'](_lxml_root(content))
+    if not divs:
+        return "Could not find Job Description"
+    strings = []
+    _description_strings(divs[0], 0, False, strings)
+    text = '\n'.join(strings).strip()
+    text = text.replace('\n\n', '')
+    text = text.replace('::marker', '-')
+    text = text.replace('-\n', '- ')
+    text = text.replace('Show less', '').replace('Show more', '')
+    return text
+
+@lru_cache(maxsize=None)
+def get_html_backend(backend):
+    # The HTML parser set by config['html_parser'], falling back to html.parser if lxml isn't installed
+    if backend == 'lxml' and lxml_html is None:
+        print("lxml is not installed (pip install lxml), using html.parser instead")
+        return 'html.parser'
+    if backend not in ('lxml', 'html.parser'):
+        print(f"Unknown HTML parser: {backend}, using html.parser instead")
+        return 'html.parser'
+    return backend
+
+def parse_cards(content, config):
+    # Parse the job cards of a raw search results page with the configured HTML parser
+    if get_html_backend(config.get('html_parser', 'html.parser')) == 'lxml':
+        return transform_lxml(content)
+    return transform(BeautifulSoup(content, 'html.parser') if content is not None else None)
+
+# langdetect is random by default, seeding it makes the same text always get the same language
+DetectorFactory.seed = 0
+
+_langdetect_lock = threading.Lock()
+_langdetect_loaded = False
+
 def safe_detect(text):
+    # langdetect loads its language profiles on first use without a lock, so threads detecting at the same time could see
+    # only some of them. Load them once up front.
+    global _langdetect_loaded
+    if not _langdetect_loaded:
+        with _langdetect_lock:
+            if not _langdetect_loaded:
+                init_factory()
+                _langdetect_loaded = True
     try:
         return detect(text)
     except LangDetectException:
         return 'en'
 
+_lingua_detector = None
+
+def lingua_detect(text):
+    # Detect the language with lingua in low accuracy mode, which is a lot faster than langdetect and good enough for job descriptions
+    global _lingua_detector
+    if _lingua_detector is None:
+        from lingua import LanguageDetectorBuilder
+        _lingua_detector = LanguageDetectorBuilder.from_all_languages().with_low_accuracy_mode().build()
+    language = _lingua_detector.detect_language_of(text)
+    return language.iso_code_639_1.name.lower() if language is not None else 'en'
+
+@lru_cache(maxsize=None)
+def get_language_backend(backend):
+    # Pick the language detection function for config['language_backend'], falling back to langdetect if the backend isn't installed
+    if backend == 'lingua':
+        # Only checks that it's installed, lingua_detect imports it when the first language is detected
+        if importlib.util.find_spec('lingua') is not None:
+            return lingua_detect
+        print("lingua is not installed (pip install lingua-language-detector), using langdetect instead")
+    elif backend != 'langdetect':
+        print(f"Unknown language backend: {backend}, using langdetect instead")
+    return safe_detect
+
+# Detected languages by hash of the text sample, shared by all threads of the process
+_language_cache = {}
+_language_cache_lock = threading.Lock()
+
+def detect_language(text, config):
+    # Detect the language of the first config['language_sample_chars'] characters of the text. Results are memoized by the
+    # hash of the sample, so identical descriptions are only detected once per process.
+    sample = text[:config.get('language_sample_chars', 2000)]
+    key = hashlib.blake2b(sample.encode('utf-8'), digest_size=16).digest()
+    with _language_cache_lock:
+        if key in _language_cache:
+            return _language_cache[key]
+    language = get_language_backend(config.get('language_backend', 'langdetect'))(sample)
+    with _language_cache_lock:
+        if len(_language_cache) >= config.get('language_cache_size', 10000):
+            _language_cache.clear()
+        _language_cache[key] = language
+    return language
+
+def parse_description(content, config):
+    # Parse a raw job page into the description text and its language. Runs in the parse worker pool, so it only takes and returns picklable values.
+    if get_html_backend(config.get('html_parser', 'html.parser')) == 'lxml':
+        description = transform_job_lxml(content)
+    else:
+        description = transform_job(BeautifulSoup(content or b'', 'html.parser'))
+    return description, detect_language(description, config)
+
+def compile_keywords(words, whole_words=False):
+    # Compile a keyword list into a single case-insensitive regex, so a field is scanned once instead of once per keyword.
+    # Longer keywords come first so the reported match is the most specific one. Returns None for an empty list.
+    if len(words) == 0:
+        return None
+    keywords = [word for word in words if word]
+    alternatives = '|'.join(re.escape(word) for word in sorted(keywords, key=len, reverse=True))
+    if whole_words and alternatives:
+        alternatives = rf'(?<!\w)(?:{alternatives})(?!\w)'
+    if len(keywords) < len(words):
+        # An empty keyword is in every text, as it was with the plain substring test, whole words or not
+        alternatives += '|'
+    return re.compile(alternatives, re.IGNORECASE)
+
+@lru_cache(maxsize=8)
+def _compile_filters(desc_words, title_exclude, title_include, company_exclude, whole_words):
+    return {
+        'desc_words': compile_keywords(desc_words, whole_words),
+        'title_exclude': compile_keywords(title_exclude, whole_words),
+        'title_include': compile_keywords(title_include, whole_words),
+        'company_exclude': compile_keywords(company_exclude, whole_words),
+    }
+
+def compile_filters(config):
+    # The compiled filters are cached, so they are only built once per set of keyword lists
+    return _compile_filters(tuple(config['desc_words']), tuple(config['title_exclude']), tuple(config['title_include']),
+                            tuple(config['company_exclude']), config.get('match_whole_words', False))
+
+def rejection_reason(job, config):
+    # Return the rule from config.json that filters out the job, e.g. "desc_words: farm", or None if the job is relevant
+    filters = compile_filters(config)
+    if filters['desc_words']:
+        match = filters['desc_words'].search(job['job_description'])
+        if match:
+            return f"desc_words: {match.group(0)}"
+    if filters['title_exclude']:
+        match = filters['title_exclude'].search(job['title'])
+        if match:
+            return f"title_exclude: {match.group(0)}"
+    if filters['title_include'] and not filters['title_include'].search(job['title']):
+        return "title_include: no keyword in title"
+    if len(config['languages']) > 0:
+        # The language is detected once, when the description is parsed. Job cards don't have one yet.
+        language = job.get('language') or detect_language(job['job_description'], config)
+        if language not in config['languages']:
+            return f"languages: {language}"
+    if filters['company_exclude']:
+        match = filters['company_exclude'].search(job['company'])
+        if match:
+            return f"company_exclude: {match.group(0)}"
+    return None
+
+def filter_jobs(joblist, config):
+    # Split the joblist into relevant jobs and a list of (job, reason) for the jobs that are filtered out
+    relevant = []
+    rejected = []
+    with get_metrics().stage('filter'):
+        for job in joblist:
+            reason = rejection_reason(job, config)
+            if reason is None:
+                relevant.append(job)
+            else:
+                rejected.append((job, reason))
+    return relevant, rejected
+
 def remove_irrelevant_jobs(joblist, config):
     #Filter out jobs based on description, title, and language. Set up in config.json.
-    new_joblist = [job for job in joblist if not any(word.lower() in job['job_description'].lower() for word in config['desc_words'])]   
-    new_joblist = [job for job in new_joblist if not any(word.lower() in job['title'].lower() for word in config['title_exclude'])] if len(config['title_exclude']) > 0 else new_joblist
-    new_joblist = [job for job in new_joblist if any(word.lower() in job['title'].lower() for word in config['title_include'])] if len(config['title_include']) > 0 else new_joblist
-    new_joblist = [job for job in new_joblist if safe_detect(job['job_description']) in config['languages']] if len(config['languages']) > 0 else new_joblist
-    new_joblist = [job for job in new_joblist if not any(word.lower() in job['company'].lower() for word in config['company_exclude'])] if len(config['company_exclude']) > 0 else new_joblist
+    return filter_jobs(joblist, config)[0]
 
-    return new_joblist
+def first_seen(job, seen_urls, seen_keys):
+    # True unless a job with the same job ID (URL), or the same title and company, was seen before. Only the keys are kept
+    # in the hash sets, so jobs can be checked one at a time as they stream in.
+    key = (job['title'], job['company'])
+    if job['job_url'] in seen_urls or key in seen_keys:
+        return False
+    seen_urls.add(job['job_url'])
+    seen_keys.add(key)
+    return True
 
 def remove_duplicates(joblist, config):
-    # Remove duplicate jobs in the joblist. Duplicate is defined as having the same title and company.
-    joblist.sort(key=lambda x: (x['title'], x['company']))
-    joblist = [next(g) for k, g in groupby(joblist, key=lambda x: (x['title'], x['company']))]
-    return joblist
+    # Remove duplicate jobs in the joblist, keeping the first one. Duplicate is defined as having the same job ID, or the same title and company.
+    seen_urls, seen_keys = set(), set()
+    return [job for job in joblist if first_seen(job, seen_urls, seen_keys)]
 
 def convert_date_format(date_string):
     """
@@ -131,204 +622,598 @@ def convert_date_format(date_string):
         print(f"Error: The date for job {date_string} - is not in the correct format.")
         return None
 
-def create_connection(config):
-    # Create a database connection to a SQLite database
-    conn = None
-    path = config['db_path']
-    try:
-        conn = sqlite3.connect(path) # creates a SQL database in the 'data' directory
-        #print(sqlite3.version)
-    except Error as e:
-        print(e)
-
-    return conn
-
-def create_table(conn, df, table_name):
-    ''''
-    # Create a new table with the data from the dataframe
-    df.to_sql(table_name, conn, if_exists='replace', index=False)
-    print (f"Created the {table_name} table and added {len(df)} records")
-    '''
-    # Create a new table with the data from the DataFrame
-    # Prepare data types mapping from pandas to SQLite
-    type_mapping = {
-        'int64': 'INTEGER',
-        'float64': 'REAL',
-        'datetime64[ns]': 'TIMESTAMP',
-        'object': 'TEXT',
-        'bool': 'INTEGER'
-    }
-    
-    # Prepare a string with column names and their types
-    columns_with_types = ', '.join(
-        f'"{column}" {type_mapping[str(df.dtypes[column])]}'
-        for column in df.columns
-    )
-    
-    # Prepare SQL query to create a new table
-    create_table_sql = f"""
-        CREATE TABLE IF NOT EXISTS "{table_name}" (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            {columns_with_types}
-        );
-    """
-    
-    # Execute SQL query
-    cursor = conn.cursor()
-    cursor.execute(create_table_sql)
-    
-    # Commit the transaction
-    conn.commit()
+def job_exists(job_urls, job_keys, job):
+    # The job exists if there's already a job in the database that has the same URL, or the same title, company and date
+    return job['job_url'] in job_urls or (job['title'], job['company'], job['date']) in job_keys
 
-    # Insert DataFrame records one by one
-    insert_sql = f"""
-        INSERT INTO "{table_name}" ({', '.join(f'"{column}"' for column in df.columns)})
-        VALUES ({', '.join(['?' for _ in df.columns])})
-    """
-    for record in df.to_dict(orient='records'):
-        cursor.execute(insert_sql, list(record.values()))
-    
-    # Commit the transaction
-    conn.commit()
+def build_search_url(query, config, page):
+    # Build the URL of one search result page for the search query, newest jobs first (sortBy=DD) so the pagination can stop
+    # at the first page of known jobs
+    keywords = quote(query['keywords']) # URL encode the keywords
+    location = quote(query['location']) # URL encode the location
+    base_url = config.get('base_url', 'https://www.linkedin.com')
+    return f"{base_url}/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords={keywords}&location={location}&f_TPR=&f_WT={query['f_WT']}&geoId=&f_TPR={config['timespan']}&sortBy=DD&start={25*page}"
 
-    print(f"Created the {table_name} table and added {len(df)} records")
+def fetch_page(url, config):
+    content = fetch_html(url, config)
+    print("Finished scraping page: ", url)
+    return content
 
-def update_table(conn, df, table_name):
-    # Update the existing table with new records.
-    df_existing = pd.read_sql(f'select * from {table_name}', conn)
+def scrape_query_pages(query, config, known_urls, checkpoint=None, round_number=0):
+    # Walk the search result pages of one query, yielding the job cards of each page. Pagination stops early as soon as a
+    # page comes back empty or only has jobs that are already in the database, the following pages are older and would
+    # only have known jobs as well. Pages finished by an interrupted run are taken from the checkpoint, new ones are added
+    # to it. A page from the checkpoint never stops the pagination: the interrupted run may have written its jobs already.
+    # A page that could not be downloaded says nothing about the pages after it, it's skipped and not added to the checkpoint
+    # so the next run tries it again.
+    for i in range (0, config['pages_to_scrape']):
+        url = build_search_url(query, config, i)
+        page_jobs = checkpoint.page(round_number, url) if checkpoint is not None else None
+        resumed = page_jobs is not None
+        if resumed:
+            print("Resumed page from the checkpoint: ", url)
+            get_metrics().count('pages_resumed')
+        else:
+            content = fetch_page(url, config)
+            if content is None:
+                print("Could not download the page, skipping it: ", url)
+                get_metrics().count('pages_failed')
+                continue
+            with get_metrics().stage('parse'):
+                page_jobs = parse_cards(content, config)
+            get_metrics().count('pages_scraped')
+            if checkpoint is not None:
+                checkpoint.save_page(round_number, url, page_jobs)
+        yield page_jobs
+        if len(page_jobs) == 0:
+            print("No job cards on the page, skipping the remaining pages of: ", query['keywords'], query['location'])
+            break
+        if not resumed and all(job['job_url'] in known_urls for job in page_jobs):
+            print("Only known jobs on the page, skipping the remaining pages of: ", query['keywords'], query['location'])
+            break
 
-    # Create a dataframe with unique records in df that are not in df_existing
-    df_new_records = pd.concat([df, df_existing, df_existing]).drop_duplicates(['title', 'company', 'date'], keep=False)
+def scrape_query(query, config, known_urls, checkpoint=None, round_number=0):
+    # All job cards of one query
+    return [job for page_jobs in scrape_query_pages(query, config, known_urls, checkpoint, round_number) for job in page_jobs]
 
-    # If there are new records, append them to the existing table
-    if len(df_new_records) > 0:
-        df_new_records.to_sql(table_name, conn, if_exists='append', index=False)
-        print (f"Added {len(df_new_records)} new records to the {table_name} table")
-    else:
-        print (f"No new records to add to the {table_name} table")
-
-def table_exists(conn, table_name):
-    # Check if the table already exists in the database
-    cur = conn.cursor()
-    cur.execute(f"SELECT count(name) FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-    if cur.fetchone()[0]==1 :
-        return True
-    return False
-
-def job_exists(df, job):
-    # Check if the job already exists in the dataframe
-    if df.empty:
-        return False
-    #return ((df['title'] == job['title']) & (df['company'] == job['company']) & (df['date'] == job['date'])).any()
-    #The job exists if there's already a job in the database that has the same URL
-    return ((df['job_url'] == job['job_url']).any() | (((df['title'] == job['title']) & (df['company'] == job['company']) & (df['date'] == job['date'])).any()))
+def stream_jobcards(config, known_urls=frozenset(), checkpoint=None):
+    # Yield the job cards of all search queries as soon as their page is parsed. Search queries are scraped concurrently by
+    # up to config['concurrency'] threads, which hand every page over through a queue. The per host limits are enforced in
+    # fetch_html.
+    pages = Queue()
+    queries = [(k, query) for k in range(0, config['rounds']) for query in config['search_queries']]
+
+    def scrape(round_number, query):
+        for page_jobs in scrape_query_pages(query, config, known_urls, checkpoint, round_number):
+            pages.put(page_jobs)
+
+    with ThreadPoolExecutor(max_workers=config.get('concurrency', 1)) as executor:
+        futures = [executor.submit(scrape, k, query) for k, query in queries]
+        for future in futures:
+            # None marks a finished query, whether it succeeded or not
+            future.add_done_callback(lambda future: pages.put(None))
+        finished = 0
+        while finished < len(futures):
+            page_jobs = pages.get()
+            if page_jobs is None:
+                finished += 1
+            else:
+                yield from page_jobs
+        for future in futures:
+            future.result()
+
+def relevant_jobcards(jobs, config, counts):
+    # De-duplicate and filter a stream of job cards, counting them in counts as they pass
+    metrics = get_metrics()
+    seen_urls, seen_keys = set(), set()
+    for job in jobs:
+        counts['scraped'] += 1
+        with metrics.stage('dedup'):
+            unique = first_seen(job, seen_urls, seen_keys)
+        if not unique:
+            continue
+        counts['unique'] += 1
+        with metrics.stage('filter'):
+            reason = rejection_reason(job, config)
+        if reason is not None:
+            counts[f"removed by {reason.split(':')[0]}"] += 1
+            continue
+        counts['relevant'] += 1
+        yield job
 
-def get_jobcards(config):
+def print_card_counts(counts):
+    print ("Total job cards scraped: ", counts['scraped'])
+    print ("Total job cards after removing duplicates: ", counts['unique'])
+    for name, count in counts.items():
+        if name.startswith('removed by '):
+            print (f"Job cards {name}: {count}")
+    print ("Total job cards after removing irrelevant jobs: ", counts['relevant'])
+    get_metrics().count('job_cards', counts['scraped'])
+
+def get_jobcards(config, known_urls=frozenset(), checkpoint=None):
     #Function to get the job cards from the search results page
-    all_jobs = []
-    for k in range(0, config['rounds']):
-        for query in config['search_queries']:
-            keywords = quote(query['keywords']) # URL encode the keywords
-            location = quote(query['location']) # URL encode the location
-            for i in range (0, config['pages_to_scrape']):
-                url = f"https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords={keywords}&location={location}&f_TPR=&f_WT={query['f_WT']}&geoId=&f_TPR={config['timespan']}&start={25*i}"
-                soup = get_with_retry(url, config)
-                jobs = transform(soup)
-                all_jobs = all_jobs + jobs
-                print("Finished scraping page: ", url)
-    print ("Total job cards scraped: ", len(all_jobs))
-    all_jobs = remove_duplicates(all_jobs, config)
-    print ("Total job cards after removing duplicates: ", len(all_jobs))
-    all_jobs = remove_irrelevant_jobs(all_jobs, config)
-    print ("Total job cards after removing irrelevant jobs: ", len(all_jobs))
+    counts = Counter()
+    all_jobs = list(relevant_jobcards(stream_jobcards(config, known_urls, checkpoint), config, counts))
+    print_card_counts(counts)
     return all_jobs
 
-def find_new_jobs(all_jobs, conn, config):
+def find_new_jobs(all_jobs, conn, config, known_jobs=None):
     # From all_jobs, find the jobs that are not already in the database. Function checks both the jobs and filtered_jobs tables.
-    jobs_tablename = config['jobs_tablename']
-    filtered_jobs_tablename = config['filtered_jobs_tablename']
-    jobs_db = pd.DataFrame()
-    filtered_jobs_db = pd.DataFrame()    
-    if conn is not None:
-        if table_exists(conn, jobs_tablename):
-            query = f"SELECT * FROM {jobs_tablename}"
-            jobs_db = pd.read_sql_query(query, conn)
-        if table_exists(conn, filtered_jobs_tablename):
-            query = f"SELECT * FROM {filtered_jobs_tablename}"
-            filtered_jobs_db = pd.read_sql_query(query, conn)
-
-    new_joblist = [job for job in all_jobs if not job_exists(jobs_db, job) and not job_exists(filtered_jobs_db, job)]
+    # known_jobs are the (job_urls, job_keys) sets from load_job_keys, they are loaded from the database if not given.
+    with get_metrics().stage('dedup'):
+        job_urls, job_keys = known_jobs if known_jobs is not None else load_job_keys(conn, config)
+        new_joblist = [job for job in all_jobs if not job_exists(job_urls, job_keys, job)]
     return new_joblist
 
-def main(config_file):
-    start_time = tm.perf_counter()
+def get_near_duplicate_index(conn, config):
+    # The near-duplicate index of the database, or None if config['near_duplicate_threshold'] is 0
+    threshold = config.get('near_duplicate_threshold', 0.85)
+    if conn is None or not threshold:
+        return None
+    return NearDuplicateIndex(conn, threshold, config['days_to_scrape'])
+
+def save_near_duplicate_cards(conn, jobs, config):
+    # Job cards skipped as near duplicates go to the filtered_jobs table without a description, with the job they duplicate
+    # in filter_reason, so they are not scraped again and the decision can be checked later
+    if len(jobs) == 0:
+        return
+    date_loaded = str(datetime.now())
+    for job in jobs:
+        job['date_loaded'] = date_loaded
+    with get_metrics().stage('db_write'):
+        added = insert_jobs(conn, jobs, config['filtered_jobs_tablename'])
+    get_metrics().count('jobs_filtered', added)
+
+def remove_near_duplicates(all_jobs, conn, config):
+    # Skip the jobs whose card nearly duplicates a recent job seen before, or another job of the list, like the same job
+    # re-posted under a new URL with a new date. Nothing is downloaded for them.
+    index = get_near_duplicate_index(conn, config)
+    if index is None:
+        return all_jobs
     job_list = []
+    skipped = []
+    with get_metrics().stage('dedup'):
+        for job in all_jobs:
+            match = index.check_card(job)
+            if match is not None:
+                print('Skipping near duplicate: ', job['title'], 'at ', job['company'], 'of', match)
+                job['filter_reason'] = f"near_duplicate: {match}"
+                skipped.append(job)
+                continue
+            job_list.append(job)
+        conn.commit()
+    save_near_duplicate_cards(conn, skipped, config)
+    get_metrics().count('near_duplicates_skipped', len(skipped))
+    return job_list
 
-    config = load_config(config_file)
-    jobs_tablename = config['jobs_tablename'] # name of the table to store the "approved" jobs
-    filtered_jobs_tablename = config['filtered_jobs_tablename'] # name of the table to store the jobs that have been filtered out based on description keywords (so that in future they are not scraped again)
-    #Scrape search results page and get job cards. This step might take a while based on the number of pages and search queries.
-    all_jobs = get_jobcards(config)
-    conn = create_connection(config)
-    #filtering out jobs that are already in the database
-    all_jobs = find_new_jobs(all_jobs, conn, config)
-    print ("Total new jobs found after comparing to the database: ", len(all_jobs))
+def fetch_job_description(job, config, parse_pool=None):
+    # Download the job page and fill in the job description. Parsing is handed off to the parse pool when there is one.
+    # Returns None if the page couldn't be downloaded, the job is left for the next run instead of being saved without a description.
+    print('Found new job: ', job['title'], 'at ', job['company'], job['job_url'])
+    content = fetch_html(job['job_url'], config)
+    if content is None:
+        print('Could not download the job description, leaving the job for the next run: ', job['job_url'])
+        get_metrics().count('descriptions_failed')
+        return None
+    # With a parse pool this also counts the time the job waits for a free parse worker
+    with get_metrics().stage('parse'):
+        if parse_pool is not None:
+            description, language = parse_pool.submit(parse_description, content, config).result()
+        else:
+            description, language = parse_description(content, config)
+    get_metrics().count('descriptions_fetched')
+    job['job_description'] = description
+    job['language'] = language
+    if language not in config['languages']:
+        print('Job description language not supported: ', language)
+    return job
+
+def get_blob_store(conn, config, retrain=False):
+    # Compressor of the long texts of the jobs and filtered_jobs tables, with config['compressed_storage'] as the codec
+    return shared_store(conn, config.get('compressed_storage') or 'zstd', [config['jobs_tablename'], config['filtered_jobs_tablename']], retrain)
 
-    if len(all_jobs) > 0:
+def database_size(path):
+    # Size of the database file and its write-ahead log
+    return sum(os.path.getsize(file) for file in (path, path + '-wal') if os.path.exists(file))
 
+def compress_database(conn, config):
+    # Migration to compressed storage (--compress-db): train a dictionary on the descriptions in the database, move the
+    # descriptions, resumes and cover letters of both tables into job_blobs and give the freed space back with VACUUM.
+    # The full-text index is dropped first and built once at the end, instead of being updated row by row.
+    size_before = database_size(config['db_path'])
+    drop_search_index(conn, config['jobs_tablename'])
+    store = get_blob_store(conn, config, retrain=True)
+    print(f"Compressing with {store.codec}, " + (f"dictionary of {len(store.dictionary)} bytes" if store.dictionary else "no dictionary"))
+    for table_name in store.table_names:
+        count = store.compress_rows(table_name)
+        print(f"Compressed the texts of {count} jobs in the {table_name} table")
+    create_search_index(conn, config['jobs_tablename'])
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    size_after = database_size(config['db_path'])
+    print(f"Database size: {size_before / 2**20:.1f} MB before, {size_after / 2**20:.1f} MB after")
+    if not config.get('compressed_storage'):
+        print('Set "compressed_storage" in the config file to compress the jobs added from now on as well')
+
+def save_jobs(conn, job_list, config):
+    # Final check - removing jobs based on job description keywords words from the config file, then writing the batch to the database.
+    # Jobs removed based on job description keywords are added to the filtered_jobs table, so that in future they are not scraped again.
+    date_loaded = str(datetime.now())
+    for job in job_list:
+        job['date_loaded'] = date_loaded
+    jobs_to_add, rejected = filter_jobs(job_list, config)
+    index = get_near_duplicate_index(conn, config)
+    if index is not None:
+        # Jobs whose description nearly duplicates the one of a job in the database are filtered out as well
+        unique = []
+        with get_metrics().stage('dedup'):
+            for job in jobs_to_add:
+                match = index.check_description(job)
+                if match is not None:
+                    rejected.append((job, f"near_duplicate: {match}"))
+                else:
+                    unique.append(job)
+        get_metrics().count('near_duplicates_filtered', len(jobs_to_add) - len(unique))
+        jobs_to_add = unique
+    filtered_list = []
+    for job, reason in rejected:
+        print('Filtered out: ', job['title'], 'at ', job['company'], '-', reason)
+        job['filter_reason'] = reason
+        filtered_list.append(job)
+    if conn is None:
+        print("Error! cannot create the database connection.")
+        return jobs_to_add, filtered_list
+    for table_name, jobs in ((config['jobs_tablename'], jobs_to_add), (config['filtered_jobs_tablename'], filtered_list)):
+        if len(jobs) > 0:
+            with get_metrics().stage('db_write'):
+                store = get_blob_store(conn, config) if config.get('compressed_storage') else None
+                added = insert_jobs(conn, jobs, table_name, store)
+            get_metrics().count('jobs_added' if table_name == config['jobs_tablename'] else 'jobs_filtered', added)
+            print (f"Added {added} new records to the {table_name} table")
+    if index is not None:
+        conn.commit()
+    return jobs_to_add, filtered_list
+
+def start_method():
+    # How child processes are started: from a fork server, or spawned where there is none (Windows). Never forked, a fork
+    # copies the locks held by other threads and the open SQLite connections of this process.
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+def create_pools(config):
+    # The thread pool downloading the job descriptions and the process pool parsing them (None if config['parse_workers']
+    # is 0, they are parsed in the download threads). Forking this process while the download threads hold locks (the
+    # session, the rate limiters, sqlite) could deadlock the parse processes, see start_method.
+    fetch_pool = ThreadPoolExecutor(max_workers=config.get('concurrency', 1))
+    parse_workers = config.get('parse_workers', 0)
+    parse_pool = (ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context(start_method()))
+                  if parse_workers > 0 else None)
+    return fetch_pool, parse_pool
+
+def shutdown_pools(pools):
+    fetch_pool, parse_pool = pools
+    fetch_pool.shutdown()
+    if parse_pool is not None:
+        parse_pool.shutdown()
+
+def scrape_descriptions(all_jobs, conn, config, checkpoint=None, pools=None):
+    # Producer/consumer pipeline for the job descriptions: pages are downloaded concurrently by a thread pool, parsing and
+    # language detection run in a process pool (config['parse_workers'], 0 parses in the download threads) and finished
+    # jobs are written to the database in batches of config['write_batch_size'] as soon as they complete.
+    # all_jobs can be a generator like stream_new_jobs: every job is downloaded as soon as it arrives, and the jobs finished
+    # in the meantime are written while the next ones are still coming.
+    # Jobs that already have a description (downloaded by an interrupted run) are written without downloading them again.
+    # Jobs whose page couldn't be downloaded aren't written at all, so the next run tries them again.
+    # pools are the (fetch_pool, parse_pool) of create_pools, kept by callers that scrape over and over like the daemon.
+    # Without them pools are created for this call and shut down at the end.
+    batch_size = config.get('write_batch_size', 50)
+    jobs_added, jobs_filtered, batch = [], [], []
+
+    def flush():
+        added, filtered = save_jobs(conn, batch, config)
+        jobs_added.extend(added)
+        jobs_filtered.extend(filtered)
+        if checkpoint is not None:
+            checkpoint.finish_jobs(batch)
+        batch.clear()
+
+    def add(job):
+        batch.append(job)
+        if len(batch) >= batch_size:
+            flush()
+
+    def downloaded(future):
+        job = future.result()
+        if job is None:
+            return
+        if checkpoint is not None:
+            checkpoint.save_job(job)
+        add(job)
+
+    # Finished downloads, handed over to this thread which does all the database writes
+    completed = Queue()
+    own_pools = pools is None
+    fetch_pool, parse_pool = create_pools(config) if own_pools else pools
+    try:
+        pending = 0
         for job in all_jobs:
-            job_date = convert_date_format(job['date'])
-            job_date = datetime.combine(job_date, time())
-            #if job is older than a week, skip it
-            if job_date < datetime.now() - timedelta(days=config['days_to_scrape']):
+            if job['job_description']:
+                add(job)
+            else:
+                fetch_pool.submit(fetch_job_description, job, config, parse_pool).add_done_callback(completed.put)
+                pending += 1
+            while not completed.empty():
+                downloaded(completed.get())
+                pending -= 1
+        while pending > 0:
+            downloaded(completed.get())
+            pending -= 1
+    finally:
+        if own_pools:
+            shutdown_pools((fetch_pool, parse_pool))
+    if len(batch) > 0:
+        flush()
+    return jobs_added, jobs_filtered
+
+def is_recent(job, config):
+    # False for the jobs posted more than config['days_to_scrape'] days ago
+    job_date = convert_date_format(job['date'])
+    job_date = datetime.combine(job_date, time())
+    return job_date >= datetime.now() - timedelta(days=config['days_to_scrape'])
+
+def recent_jobs(all_jobs, config):
+    # Skip the jobs posted more than config['days_to_scrape'] days ago
+    return [job for job in all_jobs if is_recent(job, config)]
+
+def stream_new_jobs(config, conn, known_jobs, checkpoint=None):
+    # Scrape the job cards of config['search_queries'] and yield the recent ones that aren't in the database yet. Every card
+    # goes through de-duplication, the filters, the database lookup and the near-duplicate check on its own, as soon as its
+    # page is parsed, so the descriptions of the first new jobs are downloaded while later pages are still being scraped.
+    # New jobs are added to the checkpoint as they are yielded. Once all pages are done the checkpoint moves on to the
+    # descriptions stage. When an interrupted run is resumed, the jobs it left pending are yielded first: the ones it wrote
+    # to the database in the meantime are known jobs now and wouldn't come out of the job cards again.
+    metrics = get_metrics()
+    job_urls, job_keys = known_jobs
+    index = get_near_duplicate_index(conn, config)
+    counts = Counter()
+    resumed_urls = set()
+    if checkpoint is not None:
+        for job in checkpoint.pending_jobs():
+            resumed_urls.add(job['job_url'])
+            yield job
+        if len(resumed_urls) > 0:
+            print ("Resuming the interrupted run, jobs left: ", len(resumed_urls))
+    for job in relevant_jobcards(stream_jobcards(config, job_urls, checkpoint), config, counts):
+        #filtering out jobs that are already in the database
+        with metrics.stage('dedup'):
+            exists = job['job_url'] in resumed_urls or job_exists(job_urls, job_keys, job)
+        if exists:
+            continue
+        counts['new'] += 1
+        if not is_recent(job, config):
+            continue
+        if index is not None:
+            with metrics.stage('dedup'):
+                match = index.check_card(job)
+                conn.commit()
+            if match is not None:
+                print('Skipping near duplicate: ', job['title'], 'at ', job['company'], 'of', match)
+                job['filter_reason'] = f"near_duplicate: {match}"
+                save_near_duplicate_cards(conn, [job], config)
+                counts['near_duplicates'] += 1
                 continue
-            print('Found new job: ', job['title'], 'at ', job['company'], job['job_url'])
-            desc_soup = get_with_retry(job['job_url'], config)
-            job['job_description'] = transform_job(desc_soup)
-            language = safe_detect(job['job_description'])
-            if language not in config['languages']:
-                print('Job description language not supported: ', language)
-                #continue
-            job_list.append(job)
-        #Final check - removing jobs based on job description keywords words from the config file
-        jobs_to_add = remove_irrelevant_jobs(job_list, config)
+        if checkpoint is not None:
+            job = checkpoint.add_pending(job)
+        yield job
+    print_card_counts(counts)
+    print ("Total new jobs found after comparing to the database: ", counts['new'])
+    metrics.count('new_jobs', counts['new'])
+    if index is not None:
+        print ("New jobs skipped as near duplicates: ", counts['near_duplicates'])
+        metrics.count('near_duplicates_skipped', counts['near_duplicates'])
+    if checkpoint is not None:
+        checkpoint.cards_done()
+
+def run_daemon(config, conn):
+    # Keep polling every search query on its own schedule (see QuerySchedule) until interrupted. The database keys, the HTTP
+    # session, the download threads and the parse processes (with their language detection memo) stay loaded between polls,
+    # and every poll only asks for the jobs posted since the previous one. A poll that fails is reported and tried again
+    # later, it doesn't stop the daemon.
+    known_jobs = load_job_keys(conn, config)
+    min_interval = config.get('poll_min_interval', 300)
+    max_interval = config.get('poll_max_interval', 3600)
+    max_window = timespan_seconds(config['timespan'])
+    now = tm.monotonic()
+    schedules = [QuerySchedule(query, min_interval, max_interval, now) for query in config['search_queries']]
+    print(f"Daemon mode: polling {len(schedules)} search queries every {min_interval}-{max_interval} seconds, press Ctrl+C to stop")
+    pools = create_pools(config)
+    try:
+        while True:
+            schedule = min(schedules, key=lambda s: s.next_run)
+            wait = schedule.next_run - tm.monotonic()
+            if wait > 0:
+                tm.sleep(wait)
+            started = tm.monotonic()
+            metrics = reset_metrics()
+            window = schedule.window(started, max_window, config.get('poll_overlap', 60))
+            query_config = dict(config, search_queries=[schedule.query], timespan=f"r{window}", rounds=1)
+            print(f"Polling {schedule.query['keywords']} in {schedule.query['location']} for jobs posted in the last {window} seconds")
+            try:
+                jobs_to_add, filtered_list = scrape_descriptions(stream_new_jobs(query_config, conn, known_jobs), conn,
+                                                                 query_config, pools=pools)
+            except Exception as e:
+                print(f"Polling {schedule.query['keywords']} in {schedule.query['location']} failed: {e!r}")
+                conn.rollback()
+                schedule.failed(tm.monotonic())
+                continue
+            print ("Total jobs to add: ", len(jobs_to_add))
+            for job in jobs_to_add + filtered_list:
+                known_jobs[0].add(job['job_url'])
+                known_jobs[1].add((job['title'], job['company'], job['date']))
+            schedule.polled(started, len(jobs_to_add) + len(filtered_list))
+            metrics.write(config)
+            print(f"Next poll of {schedule.query['keywords']} in {schedule.query['location']} in {schedule.next_run - started:.0f} seconds")
+    except KeyboardInterrupt:
+        report_proxies(config)
+        print("Daemon stopped")
+    finally:
+        shutdown_pools(pools)
+
+def run_worker(config, worker_id):
+    # Worker process of the coordinator/worker mode. Claims search queries from the work queue, scrapes their job cards and
+    # queues the new jobs, then claims the queued jobs in batches and downloads their descriptions into the shared database.
+    # Stops once the queue is empty and no other worker is still working on a search that could queue more jobs.
+    metrics = reset_metrics()
+    owner = f"{worker_id}:{os.getpid()}"
+    queue = WorkQueue(config)
+    conn = create_connection(config)
+    known_jobs = load_job_keys(conn, config)
+    while True:
+        claimed = queue.claim('search', owner)
+        if len(claimed) > 0:
+            item_id, payload = claimed[0]
+            query = payload['query']
+            try:
+                jobs = remove_duplicates(scrape_query(query, config, known_jobs[0]), config)
+                jobs = filter_jobs(jobs, config)[0]
+                jobs = recent_jobs(find_new_jobs(jobs, conn, config, known_jobs), config)
+                jobs = remove_near_duplicates(jobs, conn, config)
+                queued = queue.enqueue('job', [(job['job_url'], job) for job in jobs])
+            except Exception as e:
+                print(f"{worker_id}: scraping {query['keywords']} in {query['location']} failed: {e}")
+                queue.fail([item_id], owner, e)
+            else:
+                print(f"{worker_id}: queued {queued} new jobs from {query['keywords']} in {query['location']}")
+                queue.complete([item_id], owner)
+            continue
+        claimed = queue.claim('job', owner, config.get('write_batch_size', 50))
+        if len(claimed) > 0:
+            ids = [item_id for item_id, job in claimed]
+            try:
+                scrape_descriptions([job for item_id, job in claimed], conn, config)
+            except Exception as e:
+                print(f"{worker_id}: downloading {len(ids)} job descriptions failed: {e}")
+                queue.fail(ids, owner, e)
+            else:
+                queue.complete(ids, owner)
+            continue
+        if queue.unfinished() == 0:
+            break
+        # Other workers are still scraping searches, they may queue more jobs
+        tm.sleep(1)
+    report_proxies(config)
+    metrics.write(config)
+    queue.close()
+    conn.close()
+
+def run_coordinator(config, workers):
+    # Queue every search query and start the worker processes. Each worker gets the next proxy of config['worker_proxies'],
+    # so the requests are spread over several IPs. If the queue still has unfinished work from an interrupted run, that
+    # work is resumed instead.
+    queue = WorkQueue(config)
+    if queue.unfinished() > 0:
+        print("Resuming the unfinished work queue: ", queue.counts())
+        queue.release_leases()
+    else:
+        queue.clear()
+        # Every round of a query is a search of its own, only the key tells them apart
+        searches = [(f"{k}:{json.dumps(query, sort_keys=True)}", {'query': query})
+                    for k in range(0, config['rounds']) for query in config['search_queries']]
+        queue.enqueue('search', searches)
+    worker_proxies = config.get('worker_proxies', [])
+    # Not forked: this process holds the work queue's SQLite connection, see start_method
+    context = multiprocessing.get_context(start_method())
+    processes = []
+    for i in range(workers):
+        worker_config = dict(config, proxies=worker_proxies[i % len(worker_proxies)]) if len(worker_proxies) > 0 else config
+        process = context.Process(target=run_worker, args=(worker_config, f"worker-{i}"))
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+    counts = queue.counts()
+    print(f"Work queue finished: {counts.get('done', 0)} items done, {counts.get('failed', 0)} failed")
+    queue.close()
+
+def main(config_file, replay=False, daemon=False, workers=0, worker=False, compress_db=False):
+    start_time = tm.perf_counter()
+    metrics = reset_metrics()
+
+    config = load_config(config_file)
+    if replay:
+        config['replay'] = True
+    if config.get('replay') and not config.get('cache_dir'):
+        print("Error! replay mode needs cache_dir to be set in the config file.")
+        return
+    conn = create_connection(config)
+    checkpoint = None
+    if conn is not None:
+        create_schema(conn, config['jobs_tablename']) # the "approved" jobs
+        create_schema(conn, config['filtered_jobs_tablename']) # jobs filtered out based on description keywords, so that in future they are not scraped again
+        if compress_db:
+            compress_database(conn, config)
+            return
+        if config.get('compressed_storage'):
+            create_blob_tables(conn, [config['jobs_tablename'], config['filtered_jobs_tablename']])
+        create_search_index(conn, config['jobs_tablename'])
+        index = get_near_duplicate_index(conn, config)
+        if index is not None and index.created:
+            print("Building the near-duplicate index of the jobs in the database")
+            index.index_table(config['jobs_tablename'])
+            index.index_table(config['filtered_jobs_tablename'], descriptions=False)
+        if daemon:
+            run_daemon(config, conn)
+            return
+        if workers > 0:
+            run_coordinator(config, workers)
+            return
+        if worker:
+            run_worker(config, f"worker-{os.getpid()}")
+            return
+        if config.get('checkpoint', True):
+            checkpoint = Checkpoint(config)
+    if checkpoint is not None and checkpoint.stage == 'descriptions':
+        # The job cards of the interrupted run were all collected, only its remaining descriptions are left
+        all_jobs = checkpoint.pending_jobs()
+        print ("Resuming the interrupted run, jobs left: ", len(all_jobs))
+    else:
+        #Scrape search results page and get job cards. This step might take a while based on the number of pages and search queries.
+        with metrics.stage('dedup'):
+            known_jobs = load_job_keys(conn, config)
+        all_jobs = stream_new_jobs(config, conn, known_jobs, checkpoint)
+
+    jobs_to_add, filtered_list = scrape_descriptions(all_jobs, conn, config, checkpoint)
+    if len(jobs_to_add) + len(filtered_list) > 0:
         print ("Total jobs to add: ", len(jobs_to_add))
-        #Create a list for jobs removed based on job description keywords - they will be added to the filtered_jobs table
-        filtered_list = [job for job in job_list if job not in jobs_to_add]
+
         df = pd.DataFrame(jobs_to_add)
         df_filtered = pd.DataFrame(filtered_list)
-        df['date_loaded'] = datetime.now()
-        df_filtered['date_loaded'] = datetime.now()
-        df['date_loaded'] = df['date_loaded'].astype(str)
-        df_filtered['date_loaded'] = df_filtered['date_loaded'].astype(str)        
-        
-        if conn is not None:
-            #Update or Create the database table for the job list
-            if table_exists(conn, jobs_tablename):
-                update_table(conn, df, jobs_tablename)
-            else:
-                create_table(conn, df, jobs_tablename)
-                
-            #Update or Create the database table for the filtered out jobs
-            if table_exists(conn, filtered_jobs_tablename):
-                update_table(conn, df_filtered, filtered_jobs_tablename)
-            else:
-                create_table(conn, df_filtered, filtered_jobs_tablename)
-        else:
-            print("Error! cannot create the database connection.")
-        
         df.to_csv('linkedin_jobs.csv', index=False, encoding='utf-8')
         df_filtered.to_csv('linkedin_jobs_filtered.csv', index=False, encoding='utf-8')
     else:
         print("No jobs found")
+    if checkpoint is not None:
+        checkpoint.clear()
     
+    stats = get_connection_stats()
+    print(f"HTTP requests: {stats['requests']}, connections opened: {stats['connections']}, reused: {stats['requests'] - stats['connections']}")
+    metrics.count('connections_opened', stats['connections'])
+    report_proxies(config)
+    report = metrics.report()
+    print("Time per stage: " + ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in sorted(report['stages_seconds'].items())))
+    print(f"Downloaded {report['counters'].get('bytes_downloaded', 0) / 2**20:.1f} MB, {report['counters'].get('retries', 0)} retries, {report['jobs_per_second']:.2f} jobs/s")
+    metrics.write(config)
     end_time = tm.perf_counter()
     print(f"Scraping finished in {end_time - start_time:.2f} seconds")
 
 
 if __name__ == "__main__":
-    config_file = 'config.json'  # default config file
-    if len(sys.argv) == 2:
-        config_file = sys.argv[1]
-        
-    main(config_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape LinkedIn job postings into the SQLite database")
+    parser.add_argument('config_file', nargs='?', default='config.json', help="path to the config file (default: config.json)")
+    parser.add_argument('--replay', action='store_true', help="serve every page from the response cache, without touching the network")
+    parser.add_argument('--daemon', action='store_true', help="keep running and poll every search query on its own adaptive schedule")
+    parser.add_argument('--workers', type=int, default=0, help="queue the search queries and scrape them with this many worker processes")
+    parser.add_argument('--worker', action='store_true', help="run one more worker for the work queue of a running --workers coordinator")
+    parser.add_argument('--compress-db', action='store_true', help="move the descriptions, resumes and cover letters in the database to compressed storage")
+    args = parser.parse_args()
+
+    main(args.config_file, replay=args.replay, daemon=args.daemon, workers=args.workers, worker=args.worker, compress_db=args.compress_db)
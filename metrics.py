@@ -0,0 +1,118 @@
+import json
+import threading
+import time as tm
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class RunMetrics:
+    # Counters, per-stage timers and latency histograms of one scraper run. Everything can be updated from any thread.
+    # Stage times are summed over all threads, so concurrent stages can add up to more than the run's wall clock time.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.started = tm.perf_counter()
+        self.counters = defaultdict(int)
+        self.stages = defaultdict(float)
+        self.histograms = {}
+        self.details = {}
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, name, seconds):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+            histogram = self.histograms[name]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def set_detail(self, name, value):
+        # Attach a JSON-serializable section, like the proxy health report, to the run report
+        with self.lock:
+            self.details[name] = value
+
+    @contextmanager
+    def stage(self, name):
+        start = tm.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = tm.perf_counter() - start
+            with self.lock:
+                self.stages[name] += elapsed
+
+    def report(self):
+        # The run report as a JSON-serializable dict
+        with self.lock:
+            duration = tm.perf_counter() - self.started
+            histograms = {}
+            for name, histogram in self.histograms.items():
+                histograms[name] = {
+                    'buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS, histogram['buckets'])},
+                    'over': histogram['count'] - sum(histogram['buckets']),
+                    'count': histogram['count'],
+                    'mean': histogram['sum'] / histogram['count'] if histogram['count'] else 0.0,
+                }
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'duration_seconds': round(duration, 3),
+                'jobs_per_second': round(self.counters['descriptions_fetched'] / duration, 3) if duration > 0 else 0.0,
+                'counters': dict(self.counters),
+                'stages_seconds': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+                'histograms': histograms,
+                **self.details,
+            }
+
+    def prometheus(self, prefix='linkedinscraper'):
+        # The run metrics in the Prometheus text exposition format, e.g. for node_exporter's textfile collector
+        report = self.report()
+        lines = [f"# TYPE {prefix}_run_duration_seconds gauge", f"{prefix}_run_duration_seconds {report['duration_seconds']}",
+                 f"# TYPE {prefix}_jobs_per_second gauge", f"{prefix}_jobs_per_second {report['jobs_per_second']}"]
+        for name, value in sorted(report['counters'].items()):
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        lines.append(f"# TYPE {prefix}_stage_seconds gauge")
+        for name, seconds in sorted(report['stages_seconds'].items()):
+            lines.append(f'{prefix}_stage_seconds{{stage="{name}"}} {seconds}')
+        with self.lock:
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                    cumulative += count
+                    lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+                lines.append(f"{prefix}_{name}_sum {histogram['sum']:.6f}")
+                lines.append(f"{prefix}_{name}_count {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, config):
+        # Append the JSON run report to config['metrics_report'] (one line per run) and write the Prometheus metrics to
+        # config['metrics_prometheus'], for the ones that are set
+        if config.get('metrics_report'):
+            with open(config['metrics_report'], 'a') as f:
+                f.write(json.dumps(self.report()) + '\n')
+        if config.get('metrics_prometheus'):
+            with open(config['metrics_prometheus'], 'w') as f:
+                f.write(self.prometheus())
+
+# Metrics of the current run, replaced by reset_metrics at the start of every run
+metrics = RunMetrics()
+
+def reset_metrics():
+    global metrics
+    metrics = RunMetrics()
+    return metrics
+
+def get_metrics():
+    return metrics
@@ -0,0 +1,161 @@
+import re
+import zlib
+import hashlib
+from datetime import date, timedelta
+
+import numpy as np
+
+from blob_store import blob_sql, blob_tables_exist
+
+
+# Hash values of the MinHash permutations are taken modulo this Mersenne prime
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Descriptions with fewer shingles than this (like "Could not find Job Description") are never treated as near-duplicates
+MIN_SHINGLES = 10
+
+_WORD = re.compile(r'\w+')
+
+def word_shingles(text, k=3):
+    # Overlapping k word pieces of the text. Used for the job descriptions.
+    words = normalize(text).split()
+    return {' '.join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+
+def normalize(text):
+    return ' '.join(_WORD.findall((text or '').lower()))
+
+def choose_bands(num_perm, threshold):
+    # LSH splits the signature into bands of rows, two jobs become candidates if all rows of any band are equal. The
+    # probability of that climbs steeply around (1 / bands) ** (1 / rows). Pick the split that puts it closest below the
+    # threshold: a few extra candidates cost a signature comparison, a missed one costs a download.
+    if not 1 / num_perm <= threshold <= 1:
+        raise ValueError(f"The near-duplicate threshold must be between {1 / num_perm:.3f} and 1, or 0 to disable the check")
+    splits = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [split for split in splits if (1 / split[0]) ** (1 / split[1]) <= threshold]
+    return max(below, key=lambda split: (1 / split[0]) ** (1 / split[1]))
+
+def card_key(job):
+    # Normalized company, location and title of a job card
+    return f"{normalize(job['company'])}|{normalize(job['location'])}|{normalize(job['title'])}"
+
+def create_near_duplicate_tables(conn):
+    # MinHash signatures and LSH buckets of the descriptions already seen, by kind and job URL, and the card key and posting
+    # date of every job card seen. Returns True if the tables were just created.
+    exists = conn.execute("SELECT count(*) FROM sqlite_master WHERE type='table' AND name='near_dup_cards'").fetchone()[0]
+    conn.execute('CREATE TABLE IF NOT EXISTS near_dup_signatures (kind TEXT, job_url TEXT, signature BLOB, PRIMARY KEY (kind, job_url))')
+    conn.execute('CREATE TABLE IF NOT EXISTS near_dup_buckets (kind TEXT, band INTEGER, bucket INTEGER, job_url TEXT)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_near_dup_buckets ON near_dup_buckets (kind, band, bucket)')
+    conn.execute('CREATE TABLE IF NOT EXISTS near_dup_cards (job_url TEXT PRIMARY KEY, card_key TEXT, date TEXT)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_near_dup_cards ON near_dup_cards (card_key, date)')
+    if not exists:
+        # Older versions compared the card titles by MinHash as well
+        conn.execute("DELETE FROM near_dup_signatures WHERE kind = 'card'")
+        conn.execute("DELETE FROM near_dup_buckets WHERE kind = 'card'")
+    conn.commit()
+    return not exists
+
+class NearDuplicateIndex:
+    # Finds jobs that are almost the same as one already seen: the same posting re-posted under a new URL, by the company
+    # or by a recruiter. Descriptions are compared by the Jaccard similarity of their shingles, estimated from MinHash
+    # signatures. The LSH buckets narrow the comparison down to a few candidates, so a lookup doesn't depend on the number
+    # of jobs stored. Job cards only match a card posted in the last card_days days with the same title, company and location.
+    def __init__(self, conn, threshold, card_days, num_perm=64):
+        self.conn = conn
+        self.threshold = threshold
+        self.card_days = card_days
+        self.num_perm = num_perm
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self.created = create_near_duplicate_tables(conn)
+        # Fixed seed: the signatures stored by earlier runs have to be comparable with the new ones
+        rng = np.random.RandomState(1)
+        self.a = rng.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        # MinHash signature of the text, or None if it's too short to compare
+        shingles = word_shingles(text)
+        if len(shingles) < MIN_SHINGLES:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        # The products overflow and wrap around at 64 bits on purpose, that's what scatters the small hash values
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0)
+
+    def buckets(self, signature):
+        # LSH bucket of each band
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            yield band, int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'little', signed=True)
+
+    def find(self, kind, signature, job_url):
+        # URL of the most similar job seen before (other than job_url itself) if it is at least threshold similar, else None
+        candidates = set()
+        for band, bucket in self.buckets(signature):
+            rows = self.conn.execute('SELECT job_url FROM near_dup_buckets WHERE kind = ? AND band = ? AND bucket = ?',
+                                     (kind, band, bucket))
+            candidates.update(row[0] for row in rows)
+        candidates.discard(job_url)
+        best_url, best_similarity = None, self.threshold
+        for candidate in candidates:
+            row = self.conn.execute('SELECT signature FROM near_dup_signatures WHERE kind = ? AND job_url = ?', (kind, candidate)).fetchone()
+            if row is None:
+                continue
+            similarity = float(np.mean(np.frombuffer(row[0], dtype=np.uint64) == signature))
+            if similarity >= best_similarity:
+                best_url, best_similarity = candidate, similarity
+        return best_url
+
+    def add(self, kind, job_url, signature):
+        # Remember the job, unless it already is (like a job card indexed by an interrupted run). Not committed, the caller
+        # commits together with the jobs.
+        cursor = self.conn.execute('INSERT OR IGNORE INTO near_dup_signatures (kind, job_url, signature) VALUES (?, ?, ?)',
+                                   (kind, job_url, signature.tobytes()))
+        if cursor.rowcount == 0:
+            return
+        self.conn.executemany('INSERT INTO near_dup_buckets (kind, band, bucket, job_url) VALUES (?, ?, ?, ?)',
+                              [(kind, band, bucket, job_url) for band, bucket in self.buckets(signature)])
+
+    def check(self, kind, job_url, text):
+        # URL of the job this one nearly duplicates, or None. A job that isn't a duplicate is added to the index.
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        match = self.find(kind, signature, job_url)
+        if match is None:
+            self.add(kind, job_url, signature)
+        return match
+
+    def add_card(self, job):
+        self.conn.execute('INSERT OR IGNORE INTO near_dup_cards (job_url, card_key, date) VALUES (?, ?, ?)',
+                          (job['job_url'], card_key(job), job['date']))
+
+    def check_card(self, job):
+        # Before the description is downloaded only the job card is known. It is only skipped if a card with the same title
+        # (ignoring case and punctuation) of the same company in the same location was posted in the last card_days days:
+        # titles that differ by a word ("Engineer II" and "Engineer III") are different jobs, and a job posted again
+        # weeks later is new. Everything else is left to the description check. A card that isn't a duplicate is added.
+        since = (date.today() - timedelta(days=self.card_days)).isoformat()
+        row = self.conn.execute('SELECT job_url FROM near_dup_cards WHERE card_key = ? AND date >= ? AND job_url != ? LIMIT 1',
+                                (card_key(job), since, job['job_url'])).fetchone()
+        if row is not None:
+            return row[0]
+        self.add_card(job)
+        return None
+
+    def check_description(self, job):
+        # After the download the whole description is compared, with every company: recruiters re-post the same job
+        return self.check('description', job['job_url'], job['job_description'])
+
+    def index_table(self, table_name, descriptions=True):
+        # Add the jobs already in the table to the index, without checking them against each other
+        count = 0
+        description = 'job_description'
+        if blob_tables_exist(self.conn):
+            description = f"COALESCE(job_description, {blob_sql(table_name, 'job_description', f'{table_name}.id')})"
+        for job_url, title, company, location, job_date, job_description in self.conn.execute(
+                f'SELECT job_url, title, company, location, date, {description} FROM "{table_name}"').fetchall():
+            self.add_card({'job_url': job_url, 'title': title, 'company': company, 'location': location, 'date': job_date})
+            signature = self.signature(job_description) if descriptions else None
+            if signature is not None:
+                self.add('description', job_url, signature)
+            count += 1
+        self.conn.commit()
+        return count
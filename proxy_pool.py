@@ -0,0 +1,108 @@
+import itertools
+import threading
+import time as tm
+from urllib.parse import urlparse
+
+
+# Latency in seconds a failed request counts as, the request timeout, so least_latency moves away from failing proxies
+FAILURE_LATENCY = 5.0
+
+class ProxyState:
+    # Health of one proxy (or of the direct connection): request outcomes, smoothed latency and quarantine
+    def __init__(self, proxies):
+        self.proxies = proxies
+        self.key = proxies.get('https') or proxies.get('http') or 'direct'
+        # Proxy URLs often carry credentials, only the host and port are printed and reported
+        self.name = urlparse(self.key).netloc.rsplit('@', 1)[-1] or self.key
+        self.requests = 0
+        self.successes = 0
+        self.blocks = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency = None
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+
+    def update_latency(self, latency):
+        # Exponentially weighted moving average, recent requests count most
+        self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+
+    def report(self):
+        return {
+            'proxy': self.name,
+            'requests': self.requests,
+            'successes': self.successes,
+            'blocks': self.blocks,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'success_rate': round(self.successes / self.requests, 3) if self.requests else None,
+            'latency_seconds': round(self.latency, 3) if self.latency is not None else None,
+            'quarantines': self.quarantines,
+        }
+
+class ProxyPool:
+    # Picks the proxy for every request. 'round_robin' takes turns, 'least_latency' prefers the proxy with the lowest smoothed
+    # latency, weighted by the requests it already has in flight so the fastest proxy doesn't get everything. Proxies without
+    # a latency yet are tried first.
+    # A proxy that gets blocked (429/999), times out or fails quarantine_after times in a row is left out for
+    # quarantine_seconds, twice as long every time it happens again. If every proxy is quarantined, the one that comes back
+    # first is used.
+    def __init__(self, proxy_list, strategy='round_robin', quarantine_after=3, quarantine_seconds=300):
+        self.states = [ProxyState(proxies) for proxies in proxy_list] or [ProxyState({})]
+        self.strategy = strategy
+        self.quarantine_after = quarantine_after
+        self.quarantine_seconds = quarantine_seconds
+        self.lock = threading.Lock()
+        self.turns = itertools.cycle(range(len(self.states)))
+
+    def choose(self):
+        with self.lock:
+            now = tm.monotonic()
+            available = [state for state in self.states if state.quarantined_until <= now]
+            if len(available) == 0:
+                state = min(self.states, key=lambda s: s.quarantined_until)
+            elif self.strategy == 'least_latency':
+                state = min(available, key=lambda s: ((s.latency or 0.0) * (1 + s.in_flight), s.in_flight))
+            else:
+                state = self.states[next(self.turns)]
+                while state.quarantined_until > now:
+                    state = self.states[next(self.turns)]
+            state.in_flight += 1
+            return state
+
+    def record(self, state, outcome, latency=None):
+        # outcome is 'ok', 'blocked', 'timeout' or 'error'. Server errors are the site's fault, not the proxy's: report them as 'ok'.
+        with self.lock:
+            state.in_flight -= 1
+            state.requests += 1
+            if outcome == 'ok':
+                state.successes += 1
+                state.consecutive_failures = 0
+                if latency is not None:
+                    state.update_latency(latency)
+                return
+            state.update_latency(FAILURE_LATENCY)
+            if outcome == 'blocked':
+                state.blocks += 1
+            elif outcome == 'timeout':
+                state.timeouts += 1
+            else:
+                state.errors += 1
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= self.quarantine_after and len(self.states) > 1:
+                state.quarantines += 1
+                state.consecutive_failures = 0
+                state.quarantined_until = tm.monotonic() + self.quarantine_seconds * 2 ** (state.quarantines - 1)
+                print(f"Proxy {state.name} quarantined for {self.quarantine_seconds * 2 ** (state.quarantines - 1)} seconds")
+
+    def report(self):
+        with self.lock:
+            return [state.report() for state in self.states]
+
+def proxy_list(proxies):
+    # config['proxies'] is either one requests-style dict (empty for no proxy) or a list of them
+    if isinstance(proxies, list):
+        return proxies
+    return [proxies] if len(proxies) > 0 else []
@@ -0,0 +1,42 @@
+import random
+
+
+def timespan_seconds(timespan, default=86400):
+    # Seconds of a LinkedIn f_TPR value like "r84600"
+    try:
+        return int(timespan[1:]) if timespan.startswith('r') else default
+    except ValueError:
+        return default
+
+class QuerySchedule:
+    # When to poll one search query next in daemon mode. Queries that keep turning up new jobs are polled more often (down to
+    # min_interval seconds), the interval of queries that don't grows up to max_interval. Times are time.monotonic() seconds.
+    def __init__(self, query, min_interval, max_interval, now):
+        self.query = query
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min_interval
+        self.next_run = now
+        self.last_poll = None
+
+    def window(self, now, max_window, overlap):
+        # Seconds of postings to ask LinkedIn for: the time since the last poll plus some overlap, so jobs posted while the last
+        # poll was running aren't missed. The first poll asks for the whole max_window.
+        if self.last_poll is None:
+            return max_window
+        return min(max_window, int(now - self.last_poll + overlap))
+
+    def polled(self, started, new_jobs):
+        # Schedule the next poll after a poll that started at `started` and found new_jobs new jobs. A little jitter keeps
+        # queries with the same interval from all firing at once.
+        self.last_poll = started
+        if new_jobs > 0:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        self.next_run = started + self.interval * random.uniform(0.9, 1.1)
+
+    def failed(self, now):
+        # Try again min_interval seconds after a poll that failed. The last poll stays the one that succeeded, so the next
+        # window still covers the postings the failed poll missed.
+        self.next_run = now + self.min_interval
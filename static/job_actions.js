@@ -25,6 +25,78 @@ async function showJobDetails(jobId) {
 
 
 
+async function loadMoreJobs() {
+    var button = document.getElementById('load-more');
+    const response = await fetch('/get_all_jobs?hidden=0&before_id=' + button.dataset.beforeId);
+    const data = await response.json();
+
+    data.jobs.forEach(job => button.parentNode.insertBefore(createJobItem(job), button));
+
+    if (data.next_before_id === null) {
+        button.style.display = 'none';
+    } else {
+        button.dataset.beforeId = data.next_before_id;
+    }
+}
+
+async function searchJobs(offset) {
+    // Replace the job list with the search results, an empty search brings back the full list
+    var query = document.getElementById('job-search').value.trim();
+    if (query === '') {
+        window.location.reload();
+        return;
+    }
+    const response = await fetch('/search?hidden=0&q=' + encodeURIComponent(query) + '&offset=' + offset);
+    const data = await response.json();
+    var moreButton = document.getElementById('search-more');
+    if (offset == 0) {
+        document.querySelectorAll('.job-item').forEach(item => item.remove());
+        var loadMore = document.getElementById('load-more');
+        if (loadMore) {
+            loadMore.style.display = 'none';
+        }
+    }
+    (data.jobs || []).forEach(job => moreButton.parentNode.insertBefore(createJobItem(job), moreButton));
+
+    if (data.next_offset === null || data.next_offset === undefined) {
+        moreButton.style.display = 'none';
+    } else {
+        moreButton.dataset.offset = data.next_offset;
+        moreButton.style.display = '';
+    }
+}
+
+function createJobItem(job) {
+    // Same markup as the job items rendered by jobs.html
+    var jobItem = document.createElement('a');
+    jobItem.className = 'job-item';
+    if (job.rejected == 1) {
+        jobItem.classList.add('job-item-rejected');
+    } else if (job.interview == 1) {
+        jobItem.classList.add('job-item-interview');
+    } else if (job.applied == 1) {
+        jobItem.classList.add('job-item-applied');
+    }
+    jobItem.href = '#';
+    jobItem.dataset.jobId = job.id;
+    jobItem.onclick = function(event) {
+        event.preventDefault();
+        showJobDetails(job.id);
+    };
+
+    var content = document.createElement('div');
+    content.className = 'job-content';
+    var title = document.createElement('h3');
+    title.textContent = job.title;
+    var companyLocation = document.createElement('p');
+    companyLocation.textContent = job.company + ', ' + job.location;
+    var date = document.createElement('p');
+    date.textContent = job.date;
+    content.append(title, companyLocation, date);
+    jobItem.appendChild(content);
+    return jobItem;
+}
+
 function updateCoverLetter(coverLetter) {
     var coverLetterPane = document.getElementById('cover-letter-pane');
     // Check if the coverLetterPane exists
@@ -83,13 +155,38 @@ function markAsApplied(jobId) {
 
 function markAsCoverLetter(jobId) {
     console.log('Marking job as cover letter: ' + jobId)
-    fetch('/get_CoverLetter/' + jobId, { method: 'POST' })
+    // The cover letter is generated in the background, poll until it's ready instead of waiting on the request
+    fetch('/generate/cover_letter/' + jobId, { method: 'POST' })
         .then(response => response.json())
         .then(data => {
             console.log(data);  // Log the response
-            if (data.cover_letter) {
-                // Show the job details again, this will also update the cover letter
-                showJobDetails(jobId);
+            if (data.task_id) {
+                document.getElementById('bottom-pane').innerHTML = '<p class="job-description">Generating the cover letter...</p>';
+                waitForGeneration(data.task_id, jobId);
+            }
+        });
+}
+
+function waitForGeneration(taskId, jobId) {
+    fetch('/generation_status?ids=' + taskId)
+        .then(response => response.json())
+        .then(data => {
+            var task = data.tasks[taskId];
+            if (!task) {
+                return;
+            }
+            if (task.status === 'done') {
+                // Show the job details again if the job is still selected, this will also update the cover letter
+                if (selectedJob && selectedJob.dataset.jobId == jobId) {
+                    showJobDetails(jobId);
+                }
+            } else if (task.status === 'error') {
+                console.log('Generation failed: ' + task.error);
+                if (selectedJob && selectedJob.dataset.jobId == jobId) {
+                    document.getElementById('bottom-pane').innerText = 'Could not generate the cover letter: ' + task.error;
+                }
+            } else {
+                setTimeout(function() { waitForGeneration(taskId, jobId); }, 2000);
             }
         });
 }
@@ -0,0 +1,64 @@
+import importlib
+import json
+import os
+import sys
+from datetime import date
+
+import pytest
+
+# main.py, app.py and db.py live in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db import create_connection, create_schema
+
+
+@pytest.fixture
+def config(tmp_path):
+    # config_example.json with a fresh database in tmp_path and every keyword and language filter turned off
+    with open(os.path.join(ROOT, 'config_example.json')) as f:
+        config = json.load(f)
+    config.update({'db_path': str(tmp_path / 'jobs.db'), 'desc_words': [], 'title_exclude': [], 'title_include': [],
+                   'company_exclude': [], 'languages': []})
+    return config
+
+
+@pytest.fixture
+def conn(config):
+    # Connection to the database of config, with the jobs and filtered_jobs tables created
+    conn = create_connection(config)
+    for table_name in (config['jobs_tablename'], config['filtered_jobs_tablename']):
+        create_schema(conn, table_name)
+    yield conn
+    conn.close()
+
+
+def job(i, title=None, **fields):
+    # A job card posted today with job ID i, fields override any of its values
+    job = {'title': title if title is not None else f"Developer {i}", 'company': 'Acme', 'location': 'Los Angeles, CA',
+           'date': date.today().isoformat(), 'job_url': f"https://www.linkedin.com/jobs/view/{i}/", 'job_description': ''}
+    job.update(fields)
+    return job
+
+
+@pytest.fixture
+def make_job():
+    return job
+
+
+@pytest.fixture
+def load_app(config, tmp_path, monkeypatch):
+    # Import app.py afresh, reading config from config.json in tmp_path. Its generation threads are stopped afterwards.
+    apps = []
+
+    def load():
+        (tmp_path / 'config.json').write_text(json.dumps(config))
+        monkeypatch.chdir(tmp_path)
+        sys.modules.pop('app', None)
+        app = importlib.import_module('app')
+        apps.append(app)
+        return app
+
+    yield load
+    for app in apps:
+        app.generation_pool.shutdown()
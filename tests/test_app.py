@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+from db import insert_jobs
+
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+def ids(response):
+    return [job['id'] for job in response.get_json()['jobs']]
+
+
+def test_job_list_pagination_and_filters(conn, make_job, load_app):
+    insert_jobs(conn, [make_job(i, date=days_ago(10 - i), job_description=f"Description {i}") for i in range(1, 8)], 'jobs')
+    with conn:
+        conn.execute("UPDATE jobs SET applied = 1 WHERE id IN (1, 2)")
+        conn.execute("UPDATE jobs SET hidden = 1 WHERE id = 6")
+    client = load_app().app.test_client()
+
+    # Pages follow each other by the id of their last job, newest first
+    response = client.get('/get_all_jobs?limit=3')
+    assert ids(response) == [7, 6, 5]
+    assert response.get_json()['next_before_id'] == 5
+    response = client.get('/get_all_jobs?limit=3&before_id=5')
+    assert ids(response) == [4, 3, 2]
+    response = client.get('/get_all_jobs?limit=3&before_id=2')
+    assert ids(response) == [1]
+    assert response.get_json()['next_before_id'] is None
+    # Only the summary columns are read
+    assert 'job_description' not in response.get_json()['jobs'][0]
+
+    # The filters are applied by the query, not to the page it returned: the applied jobs are the oldest ones
+    assert ids(client.get('/get_all_jobs?limit=2&applied=1')) == [2, 1]
+    assert ids(client.get('/get_all_jobs?hidden=0&applied=0')) == [7, 5, 4, 3]
+    assert ids(client.get(f"/get_all_jobs?date_from={days_ago(5)}&date_to={days_ago(4)}")) == [6, 5]
+    assert ids(client.get(f"/get_all_jobs?limit=1&before_id=6&date_from={days_ago(5)}")) == [5]
+    assert ids(client.get('/get_all_jobs?limit=1000&before_id=3')) == [2, 1]
+    for query in ('limit=ten', 'limit=0', 'limit=-1', 'limit=1001', 'before_id=-5', 'hidden=yes', 'hidden=2',
+                  'date_from=yesterday', 'date_to=2024-1-5', "date_from=2024-01-01' OR 1=1"):
+        response = client.get(f"/get_all_jobs?{query}")
+        assert response.status_code == 400, query
+        assert query.split('=')[0] in response.get_json()['error']
+    # A page that is exactly full is followed by an empty one
+    response = client.get('/get_all_jobs?limit=1&before_id=2')
+    assert ids(response) == [1] and response.get_json()['next_before_id'] == 1
+    response = client.get('/get_all_jobs?limit=1&before_id=1')
+    assert ids(response) == [] and response.get_json()['next_before_id'] is None
+
+    page = client.get('/').get_data(as_text=True)
+    assert 'Developer 7' in page and 'Developer 6' not in page
+
+
+def test_job_page_cache(conn, make_job, load_app, monkeypatch):
+    insert_jobs(conn, [make_job(i, job_description=f"Description {i}") for i in range(1, 4)], 'jobs')
+    app = load_app()
+    client = app.app.test_client()
+    rendered = []
+    render_template = app.render_template
+
+    def counting_render_template(template, **context):
+        rendered.append(context['job']['id'])
+        return render_template(template, **context)
+
+    monkeypatch.setattr(app, 'render_template', counting_render_template)
+    assert client.get('/job/404').status_code == 404
+    assert rendered == []
+
+    page = client.get('/job/1')
+    assert page.status_code == 200 and 'data-job-id="1"' in page.get_data(as_text=True)
+    assert client.get('/job/1').get_data() == page.get_data()
+    assert rendered == [1]
+    # Any update of the row stamps last_modified, the next request renders the page again
+    assert client.post('/hide_job/1').status_code == 200
+    client.get('/job/1')
+    client.get('/job/1')
+    assert rendered == [1, 1]
+
+    # Changes made by other programs are seen as well
+    client.get('/job/2')
+    with conn:
+        conn.execute("UPDATE jobs SET title = 'Staff Engineer' WHERE id = 2")
+    client.get('/job/2')
+    assert rendered == [1, 1, 2, 2]
+
+    # Least recently used pages are dropped beyond page_cache_size
+    app.config['page_cache_size'] = 2
+    client.get('/job/3')
+    assert list(app.page_cache) == [2, 3]
+    client.get('/job/1')
+    assert rendered == [1, 1, 2, 2, 3, 1]
@@ -0,0 +1,17 @@
+from benchmarks import bench_pipeline
+
+
+def test_benchmarks_run_offline(tmp_path):
+    results = bench_pipeline.run_benchmarks(sizes=[200], iterations=2, workdir=str(tmp_path))
+
+    for name in ['transform[html.parser]', 'transform_job[html.parser]', 'get_jobcards', 'remove_irrelevant_jobs[200]',
+                 'find_new_jobs[200]', 'db_write[200]']:
+        assert results[name]['items'] > 0
+        assert results[name]['seconds'] > 0
+        assert results[name]['peak_mb'] >= 0
+
+
+def test_compare_reports_regressions():
+    baseline = {'fast': {'items_per_second': 100.0}, 'slow': {'items_per_second': 100.0}}
+    results = {'fast': {'items_per_second': 95.0}, 'slow': {'items_per_second': 50.0}, 'new': {'items_per_second': 1.0}}
+    assert bench_pipeline.compare(results, baseline, 0.2) == [('slow', 0.5)]
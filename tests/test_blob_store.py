@@ -0,0 +1,123 @@
+import json
+import random
+import sqlite3
+
+import pytest
+
+import blob_store
+import main
+from db import create_connection, create_search_index, insert_jobs
+
+EEO = ("We are an equal opportunity employer and all qualified applicants will receive consideration for employment "
+       "without regard to race, color, religion, sex, sexual orientation, gender identity or national origin.")
+CODECS = ['zlib', pytest.param('zstd', marks=pytest.mark.skipif(blob_store.zstandard is None, reason='zstandard is not installed'))]
+
+
+@pytest.fixture
+def described_job(make_job):
+    def described_job(i, rng):
+        words = ['python', 'django', 'kafka', 'postgres', 'team', 'remote', 'cloud', 'design', 'review', 'mentor']
+        body = '\n'.join(' '.join(rng.choices(words, k=15)) for _ in range(5))
+        return make_job(i, company=f"Company {i}", job_description=f"{body}\nJob number {i}\n{EEO}")
+    return described_job
+
+
+def fts_matches(conn, query):
+    return [row[0] for row in conn.execute('SELECT rowid FROM jobs_fts WHERE jobs_fts MATCH ? ORDER BY rowid', (query,))]
+
+
+def check_search_index(conn):
+    # Compares the index with the text it reads through the content view
+    with conn:
+        conn.execute("INSERT INTO jobs_fts (jobs_fts, rank) VALUES ('integrity-check', 1)")
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_new_jobs_are_stored_compressed(config, conn, described_job, monkeypatch, codec):
+    # zstd can't train a dictionary on fewer than about 10 descriptions
+    monkeypatch.setattr(blob_store, 'MIN_TRAINING_SAMPLES', 10)
+    config.update({'near_duplicate_threshold': 0, 'compressed_storage': codec})
+    blob_store.create_blob_tables(conn, [config['jobs_tablename'], config['filtered_jobs_tablename']])
+    assert create_search_index(conn, 'jobs')
+    rng = random.Random(0)
+    jobs = [described_job(i, rng) for i in range(1, 16)]
+    descriptions = [j['job_description'] for j in jobs]
+    main.save_jobs(conn, jobs[:10], config)
+    # The first batch is compressed without a dictionary, by then there were enough descriptions to train one
+    main.save_jobs(conn, jobs[10:], config)
+    assert conn.execute('SELECT codec, count(*) FROM compression_dicts').fetchone() == (codec, 1)
+    assert conn.execute('SELECT dict_id IS NULL, codec, count(*) FROM job_blobs GROUP BY 1, 2').fetchall() == [
+        (0, codec, 5), (1, codec, 10)]
+    assert conn.execute('SELECT count(*) FROM jobs WHERE job_description IS NOT NULL').fetchone()[0] == 0
+    stored = [blob_store.read_blobs(conn, 'jobs', {'id': i, 'job_description': None})['job_description'] for i in range(1, 16)]
+    assert stored == descriptions
+    # The dictionary holds what the descriptions share, the ones compressed with it are smaller
+    sizes = conn.execute('SELECT dict_id IS NULL, avg(length(data)) FROM job_blobs GROUP BY 1 ORDER BY 1').fetchall()
+    assert sizes[0][1] < sizes[1][1]
+
+    assert fts_matches(conn, '"job number 7"') == [7]
+    assert fts_matches(conn, '"job number 12"') == [12]
+    check_search_index(conn)
+
+    # Other SQLite clients don't have decompress_blob, they can still write to the jobs table
+    other = sqlite3.connect(config['db_path'])
+    with other:
+        other.execute('DELETE FROM jobs WHERE id = 7')
+        other.execute("UPDATE jobs SET job_description = 'Rust services.', title = 'Rust Developer', hidden = 1 WHERE id = 8")
+        other.execute("INSERT INTO jobs (title, company, job_url, job_description) VALUES ('Go Developer', 'Acme', 'go', 'Go.')")
+    other.close()
+    assert conn.execute('SELECT count(*) FROM job_blobs WHERE job_id = 7').fetchone()[0] == 0
+    # The index picks their changes up the next time it's opened
+    assert create_search_index(conn, 'jobs')
+    assert fts_matches(conn, '"job number 7"') == []
+    assert fts_matches(conn, 'rust') == [8]
+    assert fts_matches(conn, 'go') == [16]
+    check_search_index(conn)
+
+
+def test_the_store_of_a_connection_is_reused(config, conn, described_job, monkeypatch):
+    monkeypatch.setattr(blob_store, 'MIN_TRAINING_SAMPLES', 10)
+    trained = []
+    train_dictionary = blob_store.train_dictionary
+    monkeypatch.setattr(blob_store, 'train_dictionary',
+                        lambda codec, samples: trained.append(len(samples)) or train_dictionary(codec, samples))
+    config.update({'near_duplicate_threshold': 0, 'compressed_storage': 'zlib'})
+    rng = random.Random(2)
+    for i in range(1, 13, 3):
+        main.save_jobs(conn, [described_job(j, rng) for j in range(i, i + 3)], config)
+    assert main.get_blob_store(conn, config) is main.get_blob_store(conn, config)
+    # Training is only tried again once there are enough descriptions
+    assert trained == [0, 12]
+    assert main.get_blob_store(conn, config).dict_id is not None
+    other = create_connection(config)
+    assert main.get_blob_store(other, config) is not main.get_blob_store(conn, config)
+    other.close()
+
+
+def test_compress_db_migration_and_app(config, conn, described_job, load_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, 'MIN_TRAINING_SAMPLES', 5)
+    config.update({'near_duplicate_threshold': 0, 'compressed_storage': ''})
+    create_search_index(conn, 'jobs')
+    rng = random.Random(1)
+    jobs = [described_job(i, rng) for i in range(1, 21)]
+    jobs[0]['cover_letter'] = 'Dear hiring manager'
+    insert_jobs(conn, jobs, 'jobs')
+    insert_jobs(conn, [described_job(21, rng)], 'filtered_jobs')
+    before = fts_matches(conn, 'kafka AND remote')
+    conn.close()
+
+    (tmp_path / 'config.json').write_text(json.dumps(config))
+    monkeypatch.chdir(tmp_path)
+    main.main('config.json', compress_db=True)
+    conn = create_connection(config)
+    assert conn.execute('SELECT count(*) FROM job_blobs').fetchone()[0] == 22
+    assert conn.execute("SELECT count(*) FROM jobs WHERE job_description IS NOT NULL OR cover_letter IS NOT NULL").fetchone()[0] == 0
+    assert fts_matches(conn, 'kafka AND remote') == before
+    check_search_index(conn)
+    conn.close()
+
+    client = load_app().app.test_client()
+    assert client.get('/job_details/5').get_json()['job_description'] == jobs[4]['job_description']
+    assert client.get('/get_cover_letter/1').get_json()['cover_letter'] == 'Dear hiring manager'
+    assert client.get('/job/3').status_code == 200
+    assert '**origin**' in client.get('/search?q=origin&limit=1').get_json()['jobs'][0]['snippet']
@@ -0,0 +1,94 @@
+import pytest
+
+import main
+from checkpoint import Checkpoint
+from db import load_job_keys
+
+
+@pytest.fixture
+def config(config):
+    config.update({'search_queries': [{'keywords': 'Python developer', 'location': 'USA', 'f_WT': ''}], 'rounds': 1,
+                   'pages_to_scrape': 2, 'concurrency': 1, 'write_batch_size': 1, 'near_duplicate_threshold': 0})
+    return config
+
+
+def test_checkpoint_stages(config, make_job):
+    checkpoint = Checkpoint(config)
+    checkpoint.save_page(0, 'page-1', [make_job(1), make_job(2)])
+    checkpoint.add_pending(make_job(1))
+    checkpoint.close()
+
+    # Restarted while collecting job cards: the finished page and the pending job are re-used
+    checkpoint = Checkpoint(config)
+    assert checkpoint.stage == 'cards'
+    assert checkpoint.page(0, 'page-1') == [make_job(1), make_job(2)]
+    assert checkpoint.page(1, 'page-1') is None
+    checkpoint.save_job(make_job(1, job_description='Downloaded'))
+    # A job already pending keeps its downloaded description
+    assert checkpoint.add_pending(make_job(1)) == make_job(1, job_description='Downloaded')
+    checkpoint.add_pending(make_job(2))
+    checkpoint.add_pending(make_job(3))
+    checkpoint.finish_jobs([make_job(2)])
+    checkpoint.cards_done()
+    checkpoint.close()
+
+    # Restarted while downloading descriptions: only the jobs that weren't written are left
+    checkpoint = Checkpoint(config)
+    assert checkpoint.stage == 'descriptions'
+    assert checkpoint.page(0, 'page-1') is None
+    assert checkpoint.pending_jobs() == [make_job(1, job_description='Downloaded'), make_job(3)]
+    checkpoint.clear()
+
+    checkpoint = Checkpoint(config)
+    assert checkpoint.stage == 'cards'
+    assert checkpoint.pending_jobs() == []
+    checkpoint.close()
+
+
+def test_run_interrupted_while_collecting_cards_is_resumed(config, conn, make_job, monkeypatch):
+    pages = [[make_job(1, 'Python Developer')], [make_job(2, 'Backend Developer')]]
+    urls = [main.build_search_url(config['search_queries'][0], config, i) for i in range(len(pages))]
+    # The interrupted run scraped both pages, wrote the first job and downloaded the description of the second one
+    checkpoint = Checkpoint(config)
+    for url, page_jobs in zip(urls, pages):
+        checkpoint.save_page(0, url, page_jobs)
+    first = checkpoint.add_pending(dict(pages[0][0], job_description='Python', language='en'))
+    main.save_jobs(conn, [first], config)
+    checkpoint.finish_jobs([first])
+    second = checkpoint.add_pending(pages[1][0])
+    checkpoint.save_job(dict(second, job_description='Backend', language='en'))
+    checkpoint.close()
+
+    downloaded = []
+
+    def fetch_page(url, config):
+        raise AssertionError(f"{url} is in the checkpoint")
+
+    def fetch_job_description(job, config, parse_pool=None):
+        downloaded.append(job['job_url'])
+        return job
+
+    monkeypatch.setattr(main, 'fetch_page', fetch_page)
+    monkeypatch.setattr(main, 'fetch_job_description', fetch_job_description)
+    checkpoint = Checkpoint(config)
+    assert checkpoint.stage == 'cards'
+    jobs = main.stream_new_jobs(config, conn, load_job_keys(conn, config), checkpoint)
+    added, filtered = main.scrape_descriptions(jobs, conn, config, checkpoint)
+    # The first page only has a job that is in the database now, the second job is still written, and not downloaded again
+    assert [(job['job_url'], job['job_description']) for job in added] == [(second['job_url'], 'Backend')]
+    assert downloaded == []
+    assert checkpoint.stage == 'descriptions'
+    assert checkpoint.pending_jobs() == []
+    checkpoint.clear()
+    assert sorted(row[0] for row in conn.execute('SELECT job_url FROM jobs')) == sorted(page_jobs[0]['job_url'] for page_jobs in pages)
+
+
+def test_checkpoint_of_other_searches_is_discarded(config, make_job):
+    checkpoint = Checkpoint(config)
+    checkpoint.add_pending(make_job(1))
+    checkpoint.close()
+
+    checkpoint = Checkpoint(dict(config, timespan='r604800'))
+    assert checkpoint.stage == 'cards'
+    assert checkpoint.pending_jobs() == []
+    checkpoint.close()
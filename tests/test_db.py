@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+import blob_store
+from db import ConnectionPool, create_connection, create_schema, insert_jobs
+
+
+def indexes(conn, table_name):
+    # Name and uniqueness of the indexes of the table
+    return {row[1]: row[2] for row in conn.execute(f'PRAGMA index_list("{table_name}")') if row[1].startswith('idx_')}
+
+
+def test_duplicate_jobs_are_ignored(conn, make_job):
+    assert indexes(conn, 'jobs')['idx_jobs_job_url'] == 1
+    assert indexes(conn, 'jobs')['idx_jobs_title_company_date'] == 1
+    assert insert_jobs(conn, [make_job(1), make_job(2)], 'jobs') == 2
+    # The same URL, the same title, company and date under a new URL, and a new job
+    assert insert_jobs(conn, [make_job(1, 'Renamed'), make_job(3, 'Developer 2'), make_job(4)], 'jobs') == 1
+    assert [row[0] for row in conn.execute('SELECT job_url FROM jobs ORDER BY id')] == [
+        make_job(i)['job_url'] for i in (1, 2, 4)]
+
+
+def test_table_of_an_older_version_with_duplicates(config, make_job):
+    # The jobs table as the first versions created it, before the dedup indexes, holding the same job twice
+    conn = create_connection(config)
+    conn.execute('''CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, company TEXT, location TEXT, date TEXT,
+                    job_url TEXT, job_description TEXT, applied INTEGER, hidden INTEGER, interview INTEGER, rejected INTEGER)''')
+    columns = ['title', 'company', 'location', 'date', 'job_url', 'job_description']
+    rows = [[make_job(i)[column] for column in columns] + [0, 0, 0, 0] for i in (1, 1, 2)]
+    conn.executemany('INSERT INTO jobs (title, company, location, date, job_url, job_description, applied, hidden, interview, '
+                     'rejected) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+
+    create_schema(conn, 'jobs')
+    # The duplicates are kept, the indexes still speed up the dedup lookups without being unique
+    assert indexes(conn, 'jobs')['idx_jobs_job_url'] == 0
+    assert indexes(conn, 'jobs')['idx_jobs_title_company_date'] == 0
+    assert 'last_modified' in [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+    assert insert_jobs(conn, [make_job(3, language='en')], 'jobs') == 1
+    assert conn.execute('SELECT count(*) FROM jobs').fetchone()[0] == 4
+
+    # Once the duplicates are gone the unique indexes are created
+    with conn:
+        conn.execute('DELETE FROM jobs WHERE id = 2')
+        conn.execute('DROP INDEX idx_jobs_job_url')
+        conn.execute('DROP INDEX idx_jobs_title_company_date')
+    create_schema(conn, 'jobs')
+    assert indexes(conn, 'jobs')['idx_jobs_job_url'] == 1
+    assert insert_jobs(conn, [make_job(1), make_job(5)], 'jobs') == 1
+    conn.close()
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_batch_with_different_columns(config, conn, make_job, compressed):
+    store = None
+    if compressed:
+        store = blob_store.BlobStore(conn, 'zlib', ['jobs'])
+    jobs = [make_job(1), make_job(2, language='de', filter_reason='languages: de'), make_job(3, language='en', applied=1),
+            make_job(4, language='fr', filter_reason='languages: fr')]
+    assert insert_jobs(conn, jobs, 'jobs', store) == 4
+    # Columns the first job doesn't have are written for the jobs that do, missing ones get their default
+    assert conn.execute('SELECT job_url, language, filter_reason, applied FROM jobs ORDER BY id').fetchall() == [
+        (jobs[0]['job_url'], None, None, 0), (jobs[1]['job_url'], 'de', 'languages: de', 0),
+        (jobs[2]['job_url'], 'en', None, 1), (jobs[3]['job_url'], 'fr', 'languages: fr', 0)]
+
+
+def test_connection_pool(config):
+    config.update({'db_pool_size': 2, 'sqlite_busy_timeout_ms': 1234})
+    pool = ConnectionPool(config)
+    first = pool.get()
+    assert first.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert first.execute('PRAGMA busy_timeout').fetchone()[0] == 1234
+    second = pool.get()
+    assert second is not first
+    assert second.execute('PRAGMA busy_timeout').fetchone()[0] == 1234
+
+    # Returned connections are handed out again, rolled back
+    second.execute('CREATE TABLE t (x)')
+    second.execute('INSERT INTO t VALUES (1)')
+    pool.put(second)
+    assert pool.get() is second
+    assert not second.in_transaction
+
+    # With every connection in use get() waits for one to be returned, from any thread
+    borrowed = []
+    waiting = threading.Thread(target=lambda: borrowed.append(pool.get()))
+    waiting.start()
+    waiting.join(0.2)
+    assert borrowed == []
+    pool.put(first)
+    waiting.join(5)
+    assert borrowed == [first]
+    assert pool.created == 2
+    borrowed[0].execute('SELECT 1')
+    for conn in (first, second):
+        conn.close()
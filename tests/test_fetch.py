@@ -0,0 +1,209 @@
+import http.server
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import http_cache
+import main
+from metrics import reset_metrics
+
+DESCRIPTION_PAGE = b"<div class='description__text description__text--rich'><p>Build APIs in Python.</p></div>"
+
+
+class StubLinkedInHandler(http.server.BaseHTTPRequestHandler):
+    # Answers each path with its list of (status, headers) responses in turn, the last one over and over
+    responses = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        responses = self.responses[self.path]
+        status, headers = responses.pop(0) if len(responses) > 1 else responses[0]
+        body = DESCRIPTION_PAGE if status == 200 else b'error'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(config, monkeypatch):
+    # A local server to fetch from, with fresh HTTP state: no cache, no retry waits and no limits left by other tests
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubLinkedInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubLinkedInHandler.responses = {}
+    StubLinkedInHandler.requests = []
+    config.update({'proxies': {}, 'headers': {}, 'max_retries': 3, 'backoff_base': 0, 'rate_limit': 100, 'min_rate': 1,
+                   'request_delay': 0})
+    for name, value in (('_session', None), ('_host_limiter', None), ('_proxy_pool', None), ('_rate_controllers', {})):
+        monkeypatch.setattr(main, name, value)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_rate_controller_backs_off_and_recovers():
+    controller = main.RateController(10, 1)
+    assert controller.throttle(0) == 5
+    assert controller.throttle(0) == 2.5
+    for _ in range(3):
+        controller.throttle(0)
+    assert controller.rate == 1
+    controller.recover()
+    assert controller.rate == 1.5
+    for _ in range(100):
+        controller.recover()
+    assert controller.rate == 10
+
+    # A throttled response pauses the requests through the same proxy
+    controller.throttle(0.2)
+    start = time.monotonic()
+    controller.acquire()
+    assert time.monotonic() - start >= 0.19
+
+
+def test_host_limiter_caps_and_spaces_requests_per_host():
+    limiter = main.HostLimiter(2, 0.05)
+    lock = threading.Lock()
+    in_flight = {'linkedin.com': 0, 'example.com': 0}
+    most_in_flight = dict(in_flight)
+    starts = {'linkedin.com': [], 'example.com': []}
+    begin = time.monotonic()
+
+    def request(host):
+        with limiter.slot(f"https://{host}/jobs/view/1/"):
+            with lock:
+                starts[host].append(time.monotonic())
+                in_flight[host] += 1
+                most_in_flight[host] = max(most_in_flight[host], in_flight[host])
+            time.sleep(0.1)
+            with lock:
+                in_flight[host] -= 1
+
+    threads = [threading.Thread(target=request, args=('linkedin.com',)) for _ in range(8)]
+    threads.append(threading.Thread(target=request, args=('example.com',)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert most_in_flight == {'linkedin.com': 2, 'example.com': 1}
+    linkedin = sorted(starts['linkedin.com'])
+    # Every request to a host starts at least the politeness delay after the previous one
+    assert all(later - earlier >= 0.049 for earlier, later in zip(linkedin, linkedin[1:]))
+    # 8 requests of 0.1s, 2 at a time
+    assert linkedin[-1] - begin >= 0.3
+    # Other hosts don't wait for this one
+    assert starts['example.com'][0] - begin < 0.05
+
+
+def test_parse_retry_after():
+    assert main.parse_retry_after(None) is None
+    assert main.parse_retry_after('') is None
+    assert main.parse_retry_after('7') == 7.0
+    assert main.parse_retry_after('-3') == 0.0
+    assert main.parse_retry_after('soon') is None
+    in_a_minute = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 55 <= main.parse_retry_after(in_a_minute) <= 60
+    an_hour_ago = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+    assert main.parse_retry_after(an_hour_ago) == 0.0
+
+
+def test_fetch_html_status_handling(config, stub_server):
+    StubLinkedInHandler.responses = {
+        '/ok': [(200, {})],
+        '/flaky': [(503, {}), (200, {})],
+        '/throttled': [(429, {'Retry-After': '0'}), (999, {}), (200, {})],
+        '/missing': [(404, {})],
+        '/down': [(500, {})],
+    }
+    metrics = reset_metrics()
+    assert main.fetch_html(f"{stub_server}/ok", config) == DESCRIPTION_PAGE
+    # Server errors and throttled responses are retried
+    assert main.fetch_html(f"{stub_server}/flaky", config) == DESCRIPTION_PAGE
+    assert main.fetch_html(f"{stub_server}/throttled", config) == DESCRIPTION_PAGE
+    assert main.get_rate_controller(config, {}).rate < config['rate_limit']
+    # Other client errors are not, the page is returned as it is
+    assert main.fetch_html(f"{stub_server}/missing", config) == b'error'
+    # After max_retries the page is given up on
+    assert main.fetch_html(f"{stub_server}/down", config) is None
+    assert StubLinkedInHandler.requests.count('/down') == 3
+    assert StubLinkedInHandler.requests.count('/missing') == 1
+    counters = metrics.report()['counters']
+    assert counters['throttled'] == 2
+    assert counters['server_errors'] == 4
+    assert counters['failed_urls'] == 1
+
+
+def test_search_and_job_pages_share_the_session_connections(config, make_job, stub_server, monkeypatch):
+    # Keep-alive needs HTTP/1.1, the stub answers HTTP/1.0 otherwise
+    monkeypatch.setattr(StubLinkedInHandler, 'protocol_version', 'HTTP/1.1')
+    search = '/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords=python&start=0'
+    StubLinkedInHandler.responses = {search: [(200, {})], '/jobs/view/1/': [(200, {})], '/jobs/view/2/': [(200, {})]}
+    assert main.get_connection_stats() == {'requests': 0, 'connections': 0}
+    assert main.fetch_page(stub_server + search, config) == DESCRIPTION_PAGE
+    for i in (1, 2):
+        job = main.fetch_job_description(make_job(i, job_url=f"{stub_server}/jobs/view/{i}/"), config)
+        assert job['job_description'] == 'Build APIs in Python.'
+    assert main.get_session(config) is main.get_session(dict(config, concurrency=8))
+    # The three pages came through one connection
+    assert main.get_connection_stats() == {'requests': 3, 'connections': 1}
+
+
+@pytest.mark.parametrize('parse_workers', [0, 1])
+def test_jobs_that_could_not_be_downloaded_are_not_saved(config, conn, make_job, stub_server, parse_workers):
+    config['parse_workers'] = parse_workers
+    StubLinkedInHandler.responses = {'/jobs/view/1/': [(200, {})], '/jobs/view/2/': [(500, {})]}
+    jobs = [make_job(i, job_url=f"{stub_server}/jobs/view/{i}/") for i in (1, 2)]
+    added, filtered = main.scrape_descriptions(jobs, conn, config)
+    assert [job['job_url'] for job in added] == [jobs[0]['job_url']]
+    assert added[0]['job_description'] == 'Build APIs in Python.'
+    assert filtered == []
+    # The second job is left for the next run, not stored without its description
+    assert conn.execute('SELECT job_url FROM jobs UNION ALL SELECT job_url FROM filtered_jobs').fetchall() == [(jobs[0]['job_url'],)]
+
+
+def test_only_job_pages_are_served_from_the_cache(config, stub_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, '_cache', None)
+    config['cache_dir'] = str(tmp_path / 'cache')
+    search = '/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords=python&start=0'
+    StubLinkedInHandler.responses = {search: [(200, {})], '/jobs/view/1/': [(200, {})]}
+    for _ in range(2):
+        assert main.fetch_html(stub_server + search, config) == DESCRIPTION_PAGE
+        assert main.fetch_html(f"{stub_server}/jobs/view/1/", config) == DESCRIPTION_PAGE
+    # Every round sees the search results as they are now, job descriptions are downloaded once
+    assert StubLinkedInHandler.requests == [search, '/jobs/view/1/', search]
+
+    config['replay'] = True
+    assert main.fetch_html(stub_server + search, config) == DESCRIPTION_PAGE
+    assert len(StubLinkedInHandler.requests) == 3
+
+
+def test_pages_that_could_not_be_downloaded_do_not_stop_the_search(config, make_job, monkeypatch):
+    config.update({'pages_to_scrape': 4, 'html_parser': 'html.parser'})
+    query = {'keywords': 'Python developer', 'location': 'USA', 'f_WT': ''}
+    urls = [main.build_search_url(query, config, i) for i in range(4)]
+    assert all('&sortBy=DD&' in url for url in urls)
+    # The second page fails, the third one is the end of the results
+    pages = {urls[0]: [make_job(1)], urls[1]: None, urls[2]: [], urls[3]: [make_job(4)]}
+    monkeypatch.setattr(main, 'fetch_page', lambda url, config: url if pages[url] is not None else None)
+    monkeypatch.setattr(main, 'parse_cards', lambda content, config: pages[content])
+    saved = []
+
+    class Checkpoint:
+        def page(self, round_number, url):
+            return None
+
+        def save_page(self, round_number, url, page_jobs):
+            saved.append(url)
+
+    metrics = reset_metrics()
+    assert list(main.scrape_query_pages(query, config, set(), Checkpoint())) == [[make_job(1)], []]
+    assert saved == [urls[0], urls[2]]
+    assert metrics.report()['counters']['pages_failed'] == 1
@@ -0,0 +1,88 @@
+import pytest
+
+import main
+
+RULES = ('desc_words', 'title_exclude', 'title_include', 'company_exclude')
+FIELDS = {'desc_words': 'job_description', 'title_exclude': 'title', 'title_include': 'title', 'company_exclude': 'company'}
+
+
+def old_is_relevant(job, config):
+    # The filter the compiled keywords replaced, one substring test per keyword
+    if any(word.lower() in job['job_description'].lower() for word in config['desc_words']):
+        return False
+    if len(config['title_exclude']) > 0 and any(word.lower() in job['title'].lower() for word in config['title_exclude']):
+        return False
+    if len(config['title_include']) > 0 and not any(word.lower() in job['title'].lower() for word in config['title_include']):
+        return False
+    if len(config['company_exclude']) > 0 and any(word.lower() in job['company'].lower() for word in config['company_exclude']):
+        return False
+    return True
+
+
+# (keywords, text): every rule is checked with every case
+CASES = [
+    (['python'], 'Senior PYTHON Developer'),
+    (['python'], 'Java Developer'),
+    (['Java'], 'JavaScript Engineer'),
+    (['c++'], 'C++ Engineer'),
+    (['c++'], 'C Engineer'),
+    (['.net', 'node.js'], 'Node.js and .NET Developer'),
+    (['sr.'], 'Senior Engineer'),
+    (['Clinical QA'], 'clinical qa manager'),
+    (['über'], 'ÜBER Tech'),
+    (['python', 'java'], 'Rust Developer'),
+    ([''], 'Anything at all'),
+    ([''], ''),
+    (['', 'python'], 'Go Developer'),
+    ([], 'Python Developer'),
+]
+
+
+@pytest.mark.parametrize('rule', RULES)
+@pytest.mark.parametrize('keywords, text', CASES)
+def test_compiled_keywords_match_the_old_filter(config, make_job, rule, keywords, text):
+    config[rule] = keywords
+    job = make_job(1, 'Developer', company='Acme', job_description='Build things.')
+    job[FIELDS[rule]] = text
+    assert (main.rejection_reason(job, config) is None) == old_is_relevant(job, config)
+    assert (main.remove_irrelevant_jobs([job], config) == [job]) == old_is_relevant(job, config)
+
+
+@pytest.mark.parametrize('keywords, text, matches', [
+    (['java'], 'Java Developer', True),
+    (['java'], 'JavaScript Engineer', False),
+    (['c++'], 'Senior C++ Engineer', True),
+    (['c++'], 'C++11 Engineer', False),
+    (['sr.'], 'Sr. Engineer', True),
+    (['data engineer'], 'Big Data Engineer II', True),
+    (['data engineer'], 'Big Data Engineering Manager', False),
+    ([''], 'Developer', True),
+    ([''], '(Remote)', True),
+    (['', 'java'], 'JavaScript Engineer', True),
+])
+def test_match_whole_words(keywords, text, matches):
+    assert (main.compile_keywords(keywords, whole_words=True).search(text) is not None) == matches
+    # Without whole words any match above is a substring match as well
+    if matches:
+        assert main.compile_keywords(keywords).search(text) is not None
+
+
+def test_rejection_reason_reports_the_first_rule_and_the_keyword(config, make_job):
+    config.update({'desc_words': ['clearance'], 'title_exclude': ['java', 'javascript'], 'title_include': ['engineer'],
+                   'company_exclude': ['staffing']})
+    job = make_job(1, 'JavaScript Engineer', company='Acme Staffing', job_description='Security CLEARANCE required.')
+    # The rules are checked in the order of the old filter, the text is reported as it appears in the job
+    assert main.rejection_reason(job, config) == 'desc_words: CLEARANCE'
+    job['job_description'] = 'Build things.'
+    # Of keywords matching at the same place the longest one is reported
+    assert main.rejection_reason(job, config) == 'title_exclude: JavaScript'
+    job['title'] = 'Python Developer'
+    assert main.rejection_reason(job, config) == 'title_include: no keyword in title'
+    job['title'] = 'Python Engineer'
+    assert main.rejection_reason(job, config) == 'company_exclude: Staffing'
+    job['company'] = 'Acme'
+    assert main.rejection_reason(job, config) is None
+
+    relevant, rejected = main.filter_jobs([job, dict(job, title='Java Engineer')], config)
+    assert relevant == [job]
+    assert [reason for _, reason in rejected] == ['title_exclude: Java']
@@ -0,0 +1,80 @@
+import http.server
+import json
+import threading
+import time
+
+from db import insert_jobs
+
+
+class StubLLMHandler(http.server.BaseHTTPRequestHandler):
+    # Answers every chat completion request with the start of its prompt, like an OpenAI compatible server would
+    prompts = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][0]['content']
+        self.prompts.append(prompt)
+        answer = json.dumps({
+            'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'Letter for ' + prompt[-40:]}}],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def wait_for(client, task_ids):
+    for _ in range(100):
+        tasks = client.get('/generation_status?ids=' + ','.join(task_ids)).get_json()['tasks']
+        if all(task['status'] in ('done', 'error') for task in tasks.values()):
+            return tasks
+        time.sleep(0.05)
+    raise AssertionError("generation didn't finish")
+
+
+def test_batch_generation_against_stub_server(config, conn, make_job, load_app, tmp_path, monkeypatch):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config.update({'OpenAI_API_KEY': 'test', 'OpenAI_Model': 'stub',
+                   'OpenAI_API_Base': f"http://127.0.0.1:{server.server_port}/v1", 'resume_path': str(tmp_path / 'resume.pdf')})
+    app = load_app()
+    monkeypatch.setattr(app, 'read_resume', lambda path: 'My resume')
+
+    insert_jobs(conn, [make_job(i, job_description=f"Description {i}") for i in range(3)], 'jobs')
+    with app.app.app_context():
+        app.verify_db_schema()
+    client = app.app.test_client()
+
+    try:
+        response = client.post('/generate_batch', json={'kind': 'cover_letter', 'job_ids': [1, 2, 3]})
+        assert response.status_code == 202
+        task_ids = response.get_json()['task_ids']
+        tasks = wait_for(client, list(task_ids.values()))
+        assert [task['status'] for task in tasks.values()] == ['done'] * 3
+        # Two passes per cover letter
+        assert len(StubLLMHandler.prompts) == 6
+        cover_letter = client.get('/get_cover_letter/2').get_json()['cover_letter']
+        assert cover_letter.startswith('Letter for ')
+
+        # The same prompts are answered from the cache. The old endpoint is queued as well.
+        response = client.post('/get_CoverLetter/2')
+        assert response.status_code == 202
+        tasks = wait_for(client, [response.get_json()['task_id']])
+        assert list(tasks.values())[0]['kind'] == 'cover_letter'
+        assert client.get('/get_cover_letter/2').get_json()['cover_letter'] == cover_letter
+        assert len(StubLLMHandler.prompts) == 6
+        tasks = wait_for(client, [client.post('/get_resume/3').get_json()['task_id']])
+        assert list(tasks.values())[0]['status'] == 'done'
+        assert len(StubLLMHandler.prompts) == 7
+
+        response = client.post('/generate/resume/99')
+        tasks = wait_for(client, [response.get_json()['task_id']])
+        assert list(tasks.values())[0]['error'] == 'Job not found'
+        assert client.post('/generate_batch', json={'kind': 'poem', 'job_ids': [1]}).status_code == 400
+    finally:
+        server.shutdown()
@@ -0,0 +1,47 @@
+import os
+import pytest
+from bs4 import BeautifulSoup
+import main
+
+pytest.importorskip('lxml')
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+PAGES = ['search_page.html', 'job_page.html', 'job_page_missing.html']
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_transform_parity(name):
+    content = read_fixture(name)
+    assert main.transform_lxml(content) == main.transform(BeautifulSoup(content, 'html.parser'))
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_transform_job_parity(name):
+    content = read_fixture(name)
+    assert main.transform_job_lxml(content) == main.transform_job(BeautifulSoup(content, 'html.parser'))
+
+
+def test_search_page_cards():
+    jobs = main.transform_lxml(read_fixture('search_page.html'))
+    assert [job['job_url'] for job in jobs] == [
+        'https://www.linkedin.com/jobs/view/3701234567/',
+        'https://www.linkedin.com/jobs/view/3701234568/',
+        'https://www.linkedin.com/jobs/view/3701234569/',
+        'https://www.linkedin.com/jobs/view/3701234570/',
+    ]
+    assert jobs[0]['company'] == 'Acme & Sons'
+    assert jobs[1]['company'] == 'Globex                     Corporation'
+    assert jobs[1]['date'] == '2026-10-18'
+    assert jobs[2]['company'] == ''
+
+
+def test_empty_pages():
+    assert main.transform_lxml(None) == []
+    assert main.transform_lxml(b'') == []
+    assert main.transform_job_lxml(None) == "Could not find Job Description"
+    assert main.parse_cards(None, {'html_parser': 'lxml'}) == main.parse_cards(None, {})
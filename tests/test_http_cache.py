@@ -0,0 +1,65 @@
+import os
+import time
+
+import pytest
+
+import http_cache
+from http_cache import ResponseCache
+
+SEARCH = 'https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords=python&start=0'
+JOB = 'https://www.linkedin.com/jobs/view/1/'
+
+
+class Clock:
+    # Stands in for the time module of http_cache, time only moves when the test says so
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_cache, 'tm', clock)
+    return clock
+
+
+def test_pages_expire_by_type(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), 10**6, {'job': 7200})
+    for url in (SEARCH, JOB, 'https://www.linkedin.com/company/acme'):
+        cache.put(url, b'page')
+        os.utime(cache.path(url), (clock.now, clock.now))
+    clock.now += 3599
+    assert cache.get(SEARCH) == b'page'
+    clock.now += 2
+    # Search results and other pages live an hour, job pages as long as configured
+    assert cache.get(SEARCH) is None
+    assert cache.get('https://www.linkedin.com/company/acme') is None
+    assert cache.get(JOB) == b'page'
+    clock.now += 3600
+    assert cache.get(JOB) is None
+    # Replay mode serves expired pages as well
+    assert cache.get(JOB, ignore_ttl=True) == b'page'
+    assert cache.get('https://www.linkedin.com/jobs/view/2/', ignore_ttl=True) is None
+
+
+def test_least_recently_read_pages_are_evicted(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), 1000, {})
+    urls = [f"https://www.linkedin.com/jobs/view/{i}/" for i in range(4)]
+    for i, url in enumerate(urls[:3]):
+        cache.put(url, b'x' * 300)
+        os.utime(cache.path(url), (clock.now - 100 + i, clock.now))
+    assert cache.size == 900
+    # Reading the oldest page makes it the most recently used one
+    assert cache.get(urls[0]) == b'x' * 300
+    cache.put(urls[3], b'x' * 300)
+    # Pages are removed until the cache is back under 90% of its size
+    assert [cache.get(url, ignore_ttl=True) is not None for url in urls] == [True, False, True, True]
+    assert cache.size == 900
+
+    # Replacing a page counts its new size only, and the size is measured again when the cache is opened
+    cache.put(urls[0], b'y' * 100)
+    assert cache.size == 700
+    assert ResponseCache(str(tmp_path), 1000, {}).size == 700
@@ -0,0 +1,61 @@
+import importlib.util
+
+import pytest
+
+import main
+
+ENGLISH = "We are looking for a backend developer to build and maintain the services our customers rely on every day."
+FRENCH = "Nous recherchons un développeur backend pour concevoir et maintenir les services utilisés par nos clients."
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    # A language backend that records the text it's given, with an empty memo
+    samples = []
+
+    def detect(text):
+        samples.append(text)
+        return 'en'
+
+    monkeypatch.setattr(main, '_language_cache', {})
+    monkeypatch.setattr(main, 'get_language_backend', lambda name: detect)
+    return samples
+
+
+def test_only_a_sample_of_the_text_is_detected(config, backend):
+    config['language_sample_chars'] = 10
+    assert main.detect_language(ENGLISH, config) == 'en'
+    assert backend == [ENGLISH[:10]]
+
+
+def test_detected_languages_are_memoized_by_sample(config, backend):
+    config.update({'language_sample_chars': 10, 'language_cache_size': 2})
+    main.detect_language(ENGLISH, config)
+    main.detect_language(ENGLISH, config)
+    # Texts that only differ after the sample share its language
+    main.detect_language(ENGLISH[:10] + ' something else', config)
+    assert backend == [ENGLISH[:10]]
+    main.detect_language(FRENCH, config)
+    assert len(main._language_cache) == 2
+    # A full memo is emptied, not grown
+    main.detect_language('Third text', config)
+    assert len(main._language_cache) == 1
+    main.detect_language(ENGLISH, config)
+    assert backend == [ENGLISH[:10], FRENCH[:10], 'Third text', ENGLISH[:10]]
+
+
+def test_language_backend_falls_back_to_langdetect(monkeypatch):
+    main.get_language_backend.cache_clear()
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None)
+    assert main.get_language_backend('lingua') is main.safe_detect
+    assert main.get_language_backend('cld3') is main.safe_detect
+    assert main.get_language_backend('langdetect') is main.safe_detect
+    main.get_language_backend.cache_clear()
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: object())
+    assert main.get_language_backend('lingua') is main.lingua_detect
+    main.get_language_backend.cache_clear()
+
+    assert main.safe_detect(ENGLISH) == 'en'
+    assert main.safe_detect(FRENCH) == 'fr'
+    # Text without letters has no language, it's taken as English
+    assert main.safe_detect('12345 !!!') == 'en'
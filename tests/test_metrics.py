@@ -0,0 +1,35 @@
+import json
+
+from metrics import RunMetrics
+
+
+def test_report_and_prometheus(tmp_path):
+    metrics = RunMetrics()
+    metrics.count('requests', 3)
+    metrics.count('descriptions_fetched')
+    for seconds in (0.01, 0.3, 60):
+        metrics.observe('request_duration_seconds', seconds)
+    with metrics.stage('parse'):
+        pass
+
+    report = metrics.report()
+    assert report['counters'] == {'requests': 3, 'descriptions_fetched': 1}
+    histogram = report['histograms']['request_duration_seconds']
+    assert histogram['count'] == 3
+    assert histogram['buckets']['0.05'] == 1 and histogram['buckets']['0.5'] == 1
+    assert histogram['over'] == 1
+    assert 'parse' in report['stages_seconds']
+
+    text = metrics.prometheus()
+    assert 'linkedinscraper_requests_total 3' in text
+    assert 'linkedinscraper_request_duration_seconds_bucket{le="0.5"} 2' in text
+    assert 'linkedinscraper_request_duration_seconds_bucket{le="+Inf"} 3' in text
+    assert 'linkedinscraper_stage_seconds{stage="parse"}' in text
+
+    config = {'metrics_report': str(tmp_path / 'report.jsonl'), 'metrics_prometheus': str(tmp_path / 'metrics.prom')}
+    metrics.write(config)
+    metrics.write(config)
+    lines = (tmp_path / 'report.jsonl').read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])['counters']['requests'] == 3
+    assert 'linkedinscraper_requests_total 3' in (tmp_path / 'metrics.prom').read_text()
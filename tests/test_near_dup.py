@@ -0,0 +1,92 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import main
+from db import create_connection, insert_jobs
+from near_dup import NearDuplicateIndex, choose_bands
+
+WORDS = ('python django postgres team remote build services customers data pipelines kafka design review code cloud '
+         'aws deploy monitor scale product engineers mentor agile testing api backend frontend react hiring benefits').split()
+
+
+def description(seed, length=200):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def test_choose_bands_stays_below_the_threshold():
+    bands, rows = choose_bands(64, 0.85)
+    assert bands * rows == 64
+    assert (1 / bands) ** (1 / rows) <= 0.85
+    for threshold in (0.01, 1.5):
+        with pytest.raises(ValueError):
+            choose_bands(64, threshold)
+
+
+def test_reposted_jobs_are_near_duplicates(tmp_path, make_job):
+    conn = create_connection({'db_path': str(tmp_path / 'jobs.db')})
+    index = NearDuplicateIndex(conn, 0.85, 10)
+    assert index.created
+    assert index.check_card(make_job(1, 'Senior Python Developer (Remote)')) is None
+    # The same card under a new URL, with punctuation changes
+    assert index.check_card(make_job(2, 'Senior Python Developer - Remote')) == make_job(1)['job_url']
+    # A job is never its own duplicate
+    assert index.check_card(make_job(1, 'Senior Python Developer (Remote)')) is None
+    assert index.check_card(make_job(3, 'Senior Python Developer (Remote)', company='Globex')) is None
+    assert index.check_card(make_job(4, 'Senior Python Developer (Remote)', location='Austin, TX')) is None
+    assert index.check_card(make_job(5, 'Python Developer')) is None
+    # Titles that differ by a word are different jobs, even if they are almost the same
+    assert index.check_card(make_job(12, 'Software Engineer I')) is None
+    assert index.check_card(make_job(13, 'Software Engineer II')) is None
+    assert index.check_card(make_job(14, 'Software Engineer III')) is None
+    # A job seen longer than days_to_scrape ago doesn't hide the same title posted again
+    old = (date.today() - timedelta(days=30)).isoformat()
+    assert index.check_card(make_job(15, 'Staff Engineer', date=old)) is None
+    assert index.check_card(make_job(16, 'Staff Engineer')) is None
+
+    text = description(1)
+    assert index.check_description(make_job(6, 'A', job_description=text)) is None
+    # A recruiter's copy with a few words changed and a line added
+    words = text.split()
+    words[50], words[120] = 'golang', 'rust'
+    copy = ' '.join(words) + ' Apply through our agency.'
+    assert index.check_description(make_job(7, 'B', company='Recruiters Inc', job_description=copy)) == make_job(6)['job_url']
+    assert index.check_description(make_job(8, 'C', job_description=description(2))) is None
+    # Descriptions that are too short to compare are never duplicates
+    assert index.check_description(make_job(9, 'D', job_description="Could not find Job Description")) is None
+    assert index.check_description(make_job(10, 'E', job_description="Could not find Job Description")) is None
+    conn.commit()
+    conn.close()
+
+    # The index is stored with the database
+    conn = create_connection({'db_path': str(tmp_path / 'jobs.db')})
+    index = NearDuplicateIndex(conn, 0.85, 10)
+    assert not index.created
+    assert index.check_card(make_job(11, 'Senior Python Developer, Remote')) == make_job(1)['job_url']
+    conn.close()
+
+
+def test_pipeline_skips_and_filters_near_duplicates(config, conn, make_job):
+    insert_jobs(conn, [make_job(1, 'Data Engineer', job_description=description(1))], config['jobs_tablename'])
+    # Jobs already in the database are indexed once, when the index is created
+    index = main.get_near_duplicate_index(conn, config)
+    assert index.index_table(config['jobs_tablename']) == 1
+
+    cards = [make_job(2, 'Data Engineer'), make_job(3, 'Data Engineer II'), make_job(4, 'Data  Engineer II')]
+    assert [card['job_url'] for card in main.remove_near_duplicates(cards, conn, config)] == [cards[1]['job_url']]
+    # The skipped cards are kept in the filtered jobs table with the job they duplicate
+    assert conn.execute('SELECT job_url, filter_reason FROM filtered_jobs ORDER BY id').fetchall() == [
+        (cards[0]['job_url'], f"near_duplicate: {make_job(1)['job_url']}"),
+        (cards[2]['job_url'], f"near_duplicate: {cards[1]['job_url']}")]
+
+    cards[1]['job_description'] = description(1) + ' Relocation offered.'
+    added, filtered = main.save_jobs(conn, [cards[1]], config)
+    assert added == [] and filtered == [cards[1]]
+    assert conn.execute('SELECT filter_reason FROM filtered_jobs WHERE job_url = ?', (cards[1]['job_url'],)).fetchone() == (
+        f"near_duplicate: {make_job(1)['job_url']}",)
+
+    config['near_duplicate_threshold'] = 0
+    assert main.get_near_duplicate_index(conn, config) is None
+    assert main.remove_near_duplicates(cards, conn, config) == cards
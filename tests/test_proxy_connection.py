@@ -9,6 +9,9 @@ def test_proxy_connection():
   with open('config.json') as config_file:
     config = json.load(config_file)
     proxy = config['proxies']
+    # config['proxies'] can also be a list of proxies, test the first one
+    if isinstance(proxy, list):
+      proxy = proxy[0]
 
   # Make the first API call without using the proxy
   try:
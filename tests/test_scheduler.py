@@ -0,0 +1,70 @@
+import sqlite3
+
+import main
+from scheduler import QuerySchedule, timespan_seconds
+
+
+def test_interval_adapts_to_new_jobs():
+    schedule = QuerySchedule({'keywords': 'Python developer'}, 300, 3600, now=0)
+    assert schedule.next_run == 0
+    assert schedule.window(0, 86400, 60) == 86400
+
+    schedule.polled(0, new_jobs=0)
+    assert schedule.interval == 450
+    assert 405 <= schedule.next_run <= 495
+    for _ in range(20):
+        schedule.polled(0, new_jobs=0)
+    assert schedule.interval == 3600
+
+    schedule.polled(1000, new_jobs=5)
+    assert schedule.interval == 1800
+    # Only the postings since the last poll are asked for, with some overlap
+    assert schedule.window(2800, 86400, 60) == 1860
+    assert schedule.window(10**6, 86400, 60) == 86400
+
+
+def test_timespan_seconds():
+    assert timespan_seconds('r604800') == 604800
+    assert timespan_seconds('') == 86400
+    assert timespan_seconds('rweek') == 86400
+
+
+def test_failed_poll_is_retried_with_the_same_window():
+    schedule = QuerySchedule({'keywords': 'Python developer'}, 300, 3600, now=0)
+    schedule.polled(0, new_jobs=1)
+    schedule.failed(1000)
+    assert schedule.next_run == 1300
+    assert schedule.window(1300, 86400, 60) == 1360
+
+
+def test_daemon_keeps_its_pools_and_survives_failed_polls(config, conn, make_job, tmp_path, monkeypatch):
+    config.update({'metrics_report': str(tmp_path / 'run_report.jsonl'), 'search_queries': [{'keywords': 'Python', 'location': 'USA', 'f_WT': ''},
+                                      {'keywords': 'Django', 'location': 'USA', 'f_WT': ''}],
+                   'poll_min_interval': 0, 'poll_max_interval': 0, 'parse_workers': 1, 'near_duplicate_threshold': 0})
+    created, shut_down, polls = [], [], []
+    create_pools, shutdown_pools = main.create_pools, main.shutdown_pools
+    monkeypatch.setattr(main, 'create_pools', lambda config: created.append(create_pools(config)) or created[-1])
+    monkeypatch.setattr(main, 'shutdown_pools', lambda pools: shut_down.append(pools) or shutdown_pools(pools))
+
+    def stream_new_jobs(config, conn, known_jobs):
+        return config['search_queries'][0]['keywords']
+
+    def scrape_descriptions(query, conn, config, pools=None):
+        polls.append((query, pools))
+        if len(polls) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        if len(polls) == 2:
+            raise ValueError('a bad job card')
+        if len(polls) == 5:
+            raise KeyboardInterrupt
+        return [make_job(len(polls))], []
+
+    monkeypatch.setattr(main, 'stream_new_jobs', stream_new_jobs)
+    monkeypatch.setattr(main, 'scrape_descriptions', scrape_descriptions)
+    main.run_daemon(config, conn)
+    # Both failures are tried again, and every poll shares the pools created once
+    assert [query for query, pools in polls] == ['Python', 'Django', 'Python', 'Django', 'Python']
+    assert len(created) == 1 and all(pools is created[0] for query, pools in polls)
+    assert shut_down == created
+    # A report for each poll that succeeded
+    assert len((tmp_path / 'run_report.jsonl').read_text().splitlines()) == 2
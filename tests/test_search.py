@@ -0,0 +1,47 @@
+from db import create_search_index, insert_jobs
+
+
+def test_search_index_and_endpoint(conn, make_job, load_app):
+    # Jobs written before the index exists are indexed when it's created
+    insert_jobs(conn, [make_job(1, 'Python Developer', job_description='Build APIs with Django and Postgres.')], 'jobs')
+    assert create_search_index(conn, 'jobs')
+    insert_jobs(conn, [make_job(2, 'Data Engineer', job_description='Python pipelines on Kafka.'),
+                       make_job(3, 'Frontend Developer', job_description='React and TypeScript.'),
+                       make_job(4, 'Farm Manager', job_description='Tractors.', company='Python Farms')], 'jobs')
+
+    def matches(query):
+        return [row[0] for row in conn.execute('SELECT rowid FROM jobs_fts WHERE jobs_fts MATCH ? ORDER BY rowid', (query,))]
+
+    assert matches('python') == [1, 2, 4]
+    assert matches('developers') == [1, 3]
+    # The triggers keep the index in sync
+    with conn:
+        conn.execute("UPDATE jobs SET job_description = 'Rust services.' WHERE id = 2")
+        conn.execute("UPDATE jobs SET hidden = 1 WHERE id = 3")
+        conn.execute("DELETE FROM jobs WHERE id = 4")
+    assert matches('python') == [1]
+    assert matches('rust') == [2]
+    assert matches('react') == [3]
+
+    client = load_app().app.test_client()
+    data = client.get('/search?q=developer').get_json()
+    assert sorted(found['id'] for found in data['jobs']) == [1, 3]
+    assert data['next_offset'] is None
+    data = client.get('/search?q=developer&hidden=0&limit=1').get_json()
+    assert [found['id'] for found in data['jobs']] == [1]
+    assert data['next_offset'] == 1
+    assert '**Django**' in client.get('/search?q=django').get_json()['jobs'][0]['snippet']
+    # Invalid FTS5 syntax is searched as plain words
+    assert [found['id'] for found in client.get('/search?q="rust').get_json()['jobs']] == [2]
+    assert client.get('/search').status_code == 400
+    for query in ('limit=-1', 'limit=0', 'limit=1001', 'offset=-1', 'offset=one', 'applied=3', 'date_to=tomorrow'):
+        response = client.get(f"/search?q=developer&{query}")
+        assert response.status_code == 400, query
+        assert query.split('=')[0] in response.get_json()['error']
+
+
+def test_insert_count_ignores_index_triggers(conn, make_job):
+    create_search_index(conn, 'jobs')
+    first, second, third = make_job(1, 'Python Developer'), make_job(2, 'Data Engineer'), make_job(3, 'Tester')
+    assert insert_jobs(conn, [first, second], 'jobs') == 2
+    assert insert_jobs(conn, [first, third], 'jobs') == 1
@@ -0,0 +1,42 @@
+import threading
+
+import main
+from db import load_job_keys
+
+
+def test_remove_duplicates_keeps_the_first_job(make_job):
+    jobs = [make_job(1, 'Developer'), make_job(2, 'Developer'), make_job(1, 'Engineer'), make_job(3, 'Developer', company='Globex')]
+    assert [job['job_url'] for job in main.remove_duplicates(jobs, {})] == [jobs[0]['job_url'], jobs[3]['job_url']]
+
+
+def test_descriptions_are_downloaded_while_cards_are_scraped(config, conn, make_job, monkeypatch):
+    config.update({'pages_to_scrape': 1, 'rounds': 1, 'concurrency': 2,
+                   'search_queries': [{'keywords': 'First', 'location': 'USA', 'f_WT': ''},
+                                      {'keywords': 'Second', 'location': 'USA', 'f_WT': ''}]})
+    downloading = threading.Event()
+
+    def fetch_page(url, config):
+        if 'keywords=Second' in url:
+            # The second search only finishes once the job of the first one is being downloaded
+            assert downloading.wait(5)
+        return url
+
+    def parse_cards(content, config):
+        if 'keywords=First' in content:
+            return [make_job(1, 'Python Developer'), make_job(1, 'Python Developer')]
+        return [make_job(2, 'Data Engineer'), make_job(1, 'Python Developer')]
+
+    def fetch_job_description(job, config, parse_pool=None):
+        downloading.set()
+        job['job_description'] = f"Description of {job['title']}"
+        job['language'] = 'en'
+        return job
+
+    monkeypatch.setattr(main, 'fetch_page', fetch_page)
+    monkeypatch.setattr(main, 'parse_cards', parse_cards)
+    monkeypatch.setattr(main, 'fetch_job_description', fetch_job_description)
+    jobs = main.stream_new_jobs(config, conn, load_job_keys(conn, config))
+    added, filtered = main.scrape_descriptions(jobs, conn, config)
+    assert sorted(job['title'] for job in added) == ['Data Engineer', 'Python Developer']
+    assert filtered == []
+    assert conn.execute('SELECT count(*) FROM jobs').fetchone()[0] == 2
@@ -0,0 +1,84 @@
+import json
+from datetime import date
+
+import main
+from db import insert_jobs
+from http_cache import ResponseCache
+from work_queue import WorkQueue
+
+
+def test_claim_complete_and_expired_leases(tmp_path):
+    config = {'db_path': str(tmp_path / 'jobs.db'), 'queue_lease_seconds': 60, 'queue_max_attempts': 2}
+    queue = WorkQueue(config)
+    assert queue.enqueue('job', [('a', {'n': 1}), ('b', {'n': 2})]) == 2
+    assert queue.enqueue('job', [('a', {'n': 1})]) == 0
+
+    first = queue.claim('job', 'w1')
+    assert first == [(1, {'n': 1})]
+    assert queue.claim('job', 'w2', limit=5) == [(2, {'n': 2})]
+    assert queue.claim('job', 'w3') == []
+    assert queue.claim('search', 'w3') == []
+
+    # A worker that lost its lease can't complete the item
+    queue.complete([1], 'w2')
+    assert queue.counts() == {'leased': 2}
+    queue.complete([1], 'w1')
+    assert queue.counts() == {'done': 1, 'leased': 1}
+
+    # The lease of a dead worker expires and the item is handed out again, until it runs out of attempts
+    expire_leases = "UPDATE work_queue SET lease_expires = 0 WHERE status = 'leased'"
+    with queue.conn:
+        queue.conn.execute(expire_leases)
+    assert queue.claim('job', 'w3') == [(2, {'n': 2})]
+    with queue.conn:
+        queue.conn.execute(expire_leases)
+    assert queue.claim('job', 'w4') == []
+    assert queue.counts() == {'done': 1, 'failed': 1}
+    assert queue.unfinished() == 0
+    queue.close()
+
+
+def test_failed_items_are_retried(tmp_path):
+    queue = WorkQueue({'db_path': str(tmp_path / 'jobs.db'), 'queue_max_attempts': 2})
+    queue.enqueue('search', [('q', {'query': 'python'})])
+    item_id = queue.claim('search', 'w1')[0][0]
+    queue.fail([item_id], 'w1', 'timeout')
+    assert queue.counts() == {'pending': 1}
+    assert queue.claim('search', 'w1')[0][0] == item_id
+    queue.fail([item_id], 'w1', 'timeout')
+    assert queue.counts() == {'failed': 1}
+    queue.close()
+
+
+def search_page(cards):
+    # A page of search results with a job card for each (job ID, title)
+    return ''.join(f'''<li><div data-entity-urn="urn:li:jobPosting:{i}"><div class="base-search-card__info">
+        <h3 class="base-search-card__title">{title}</h3><a class="hidden-nested-link">Acme</a>
+        <span class="job-search-card__location">Remote</span><time class="job-search-card__listdate" datetime="{date.today()}"></time>
+        </div></div></li>''' for i, title in cards).encode('utf-8')
+
+
+def test_workers_scrape_the_queued_searches(config, conn, make_job, tmp_path, monkeypatch):
+    # Worker processes don't share the stubs of this one, the pages are served from the response cache in replay mode
+    queries = [{'keywords': 'Python', 'location': 'USA', 'f_WT': ''}, {'keywords': 'Django', 'location': 'USA', 'f_WT': ''}]
+    config.update({'search_queries': queries, 'rounds': 1, 'pages_to_scrape': 1, 'near_duplicate_threshold': 0,
+                   'cache_dir': str(tmp_path / 'cache'), 'write_batch_size': 2})
+    insert_jobs(conn, [make_job(5, 'Data Engineer')], config['jobs_tablename'])
+    cache = ResponseCache(config['cache_dir'], 10**7, {})
+    cards = {'Python': [(1, 'Python Developer'), (2, 'Backend Engineer'), (3, 'Django Developer')],
+             'Django': [(3, 'Django Developer'), (4, 'Web Developer'), (5, 'Data Engineer')]}
+    for query in queries:
+        cache.put(main.build_search_url(query, config, 0), search_page(cards[query['keywords']]))
+    for i in range(1, 5):
+        page = f"<div class='description__text description__text--rich'><p>Description {i}</p></div>"
+        cache.put(f"https://www.linkedin.com/jobs/view/{i}/", page.encode('utf-8'))
+    (tmp_path / 'config.json').write_text(json.dumps(config))
+    monkeypatch.chdir(tmp_path)
+
+    main.main('config.json', replay=True, workers=2)
+    # The job both searches found and the one already in the database are written once
+    rows = conn.execute('SELECT job_url, job_description FROM jobs ORDER BY job_url').fetchall()
+    assert rows == [(f"https://www.linkedin.com/jobs/view/{i}/", f"Description {i}" if i < 5 else '') for i in range(1, 6)]
+    queue = WorkQueue(config)
+    assert queue.counts() == {'done': 6}
+    queue.close()
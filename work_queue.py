@@ -0,0 +1,92 @@
+import json
+import time as tm
+
+from db import create_connection
+
+
+class WorkQueue:
+    # Work queue shared by the worker processes, kept in a table of the jobs database so no other service is needed.
+    # Each item is a search query to scrape ('search') or a job whose description is missing ('job'), unique per key.
+    # Workers claim items with a lease: an item whose worker died is handed out again once its lease expires, up to
+    # config['queue_max_attempts'] times before it is marked as failed.
+    def __init__(self, config):
+        self.conn = create_connection(config)
+        self.lease_seconds = config.get('queue_lease_seconds', 600)
+        self.max_attempts = config.get('queue_max_attempts', 3)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS work_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                UNIQUE (kind, key)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_work_queue_status ON work_queue (kind, status, id)')
+        self.conn.commit()
+
+    def enqueue(self, kind, items):
+        # Add (key, payload) items. Items already in the queue, e.g. the same job found by two searches, are skipped.
+        # Returns the number of items added.
+        changes_before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO work_queue (kind, key, payload) VALUES (?, ?, ?)',
+                                  [(kind, key, json.dumps(payload)) for key, payload in items])
+        return self.conn.total_changes - changes_before
+
+    def claim(self, kind, owner, limit=1):
+        # Lease up to limit items of the kind to owner. Returns a list of (id, payload). Claiming is a single UPDATE, so two
+        # workers never get the same item.
+        now = tm.time()
+        with self.conn:
+            self.conn.execute("UPDATE work_queue SET status = 'failed', error = 'lease expired' "
+                              "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+            rows = self.conn.execute('''
+                UPDATE work_queue SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM work_queue
+                    WHERE kind = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                    ORDER BY id LIMIT ?
+                )
+                RETURNING id, payload
+            ''', (owner, now + self.lease_seconds, kind, now, limit)).fetchall()
+        return [(item_id, json.loads(payload)) for item_id, payload in rows]
+
+    def complete(self, ids, owner):
+        # Only the current lease holder can complete an item, a worker whose lease expired doesn't overwrite the new one
+        with self.conn:
+            self.conn.executemany("UPDATE work_queue SET status = 'done', lease_expires = NULL WHERE id = ? AND owner = ?",
+                                  [(item_id, owner) for item_id in ids])
+
+    def fail(self, ids, owner, error):
+        # Put the items back for another attempt, or mark them as failed after the last one
+        with self.conn:
+            self.conn.executemany('''
+                UPDATE work_queue SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                      lease_expires = NULL, error = ?
+                WHERE id = ? AND owner = ?
+            ''', [(self.max_attempts, str(error), item_id, owner) for item_id in ids])
+
+    def counts(self):
+        return dict(self.conn.execute('SELECT status, count(*) FROM work_queue GROUP BY status'))
+
+    def unfinished(self):
+        counts = self.counts()
+        return counts.get('pending', 0) + counts.get('leased', 0)
+
+    def release_leases(self):
+        # Hand the items leased by the workers of an interrupted run out again right away
+        with self.conn:
+            self.conn.execute("UPDATE work_queue SET status = 'pending', lease_expires = NULL WHERE status = 'leased'")
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute('DELETE FROM work_queue')
+
+    def close(self):
+        self.conn.close()